@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""
+Syncing a large many-to-many collection.
+
+Adds one member to a collection of `size` members, by replacing the whole
+collection (what `sync` used to do), with the delta sync, and with the delta
+sync of a `keys_only` field. Run with::
+
+    $ python benchmarks/bench_collections.py [size]
+"""
+import sys
+import time
+
+import sqlalchemy as sa
+from sqlalchemy.orm import sessionmaker, relation
+from sqlalchemy.ext.declarative import declarative_base
+
+from formalchemy import FieldSet
+
+Base = declarative_base()
+
+memberships = sa.Table('memberships', Base.metadata,
+    sa.Column('member_id', sa.Integer, sa.ForeignKey('members.id'), primary_key=True),
+    sa.Column('club_id', sa.Integer, sa.ForeignKey('clubs.id'), primary_key=True))
+
+class Club(Base):
+    __tablename__ = 'clubs'
+    id = sa.Column(sa.Integer, primary_key=True)
+    name = sa.Column(sa.Unicode(20))
+
+class Member(Base):
+    __tablename__ = 'members'
+    id = sa.Column(sa.Integer, primary_key=True)
+    clubs = relation(Club, secondary=memberships)
+
+
+def setup(size):
+    engine = sa.create_engine('sqlite://')
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    session.execute(Club.__table__.insert(), [{'name': u'club %d' % i} for i in range(size + 1)])
+    session.execute(Member.__table__.insert(), [{'id': 1}])
+    session.execute(memberships.insert(), [{'member_id': 1, 'club_id': i + 1} for i in range(size)])
+    session.commit()
+    return session
+
+
+def bench(title, size, configure, sync):
+    session = setup(size)
+    member = session.query(Member).get(1)
+    data = {'Member-1-clubs': [str(i + 1) for i in range(size + 1)]}
+    fs = FieldSet(member, data=data)
+    fs.configure(include=[configure(fs)])
+    start = time.time()
+    sync(fs)
+    session.commit()
+    seconds = time.time() - start
+    count = session.execute(memberships.count()).scalar()
+    assert count == size + 1, count
+    print '%-30s %8.3f s' % (title, seconds)
+
+
+def main(size=20000):
+    def replace(fs):
+        setattr(fs.model, 'clubs', fs.clubs._deserialize())
+    def sync(fs):
+        fs.sync()
+    bench('replace the collection', size, lambda fs: fs.clubs, replace)
+    bench('delta sync', size, lambda fs: fs.clubs, sync)
+    bench('delta sync, keys_only()', size, lambda fs: fs.clubs.keys_only(), sync)
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:]])
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""
+E-mail validation throughput.
+
+Validates generated addresses of a signup form or contact import with
+`email_verbose`, one at a time and with its `batch` version, and with the
+character loop `email_verbose` ran before it used regular expressions
+(the reference copy of the tests), for distinct addresses and for addresses
+repeated as in a contact import. Run with::
+
+    $ python benchmarks/bench_email.py [addresses]
+"""
+import sys
+import timeit
+
+from formalchemy.validators import email_verbose, ValidationError
+from formalchemy.tests.test_validators import _email_verbose_reference
+
+
+def addresses(count):
+    kinds = [u'john.smith%d@example.com',
+             u'first.middle.last+tag%d@mail.subdomain.example.org',
+             u'"john smith"%d.x@example.com',
+             u'not an address %d',
+             u'john%d@example..com']
+    return [kinds[i % len(kinds)] % i for i in range(count)]
+
+
+def bench(title, func, values, number=3):
+    seconds = min(timeit.Timer(lambda: func(values)).repeat(number, 1))
+    print '%-26s %9.0f addresses/s  (%.2f us/address)' % (title, len(values) / seconds, seconds / len(values) * 1e6)
+
+
+def main(count=20000):
+    def one_by_one(validator):
+        def run(values):
+            for value in values:
+                try:
+                    validator(value)
+                except ValidationError:
+                    pass
+        return run
+    distinct = addresses(count)
+    repeated = addresses(max(1, count // 50)) * 50
+    for title, values in (('distinct', distinct), ('repeated', repeated)):
+        print title
+        bench('character loop (before)', one_by_one(_email_verbose_reference), values)
+        bench('email_verbose', one_by_one(email_verbose), values)
+        bench('email_verbose.batch', email_verbose.batch, values)
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:]])
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""
+Field value throughput.
+
+Reads `raw_value`, `model_value` and `value` of every field of a Grid, row
+by row, the way the grid templates do. Run with::
+
+    $ python benchmarks/bench_fields.py [rows]
+"""
+import sys
+import timeit
+
+import sqlalchemy as sa
+from sqlalchemy.orm import sessionmaker, relation
+from sqlalchemy.ext.declarative import declarative_base
+
+from formalchemy import Grid
+
+Base = declarative_base()
+
+class User(Base):
+    __tablename__ = 'users'
+    id = sa.Column(sa.Integer, primary_key=True)
+    name = sa.Column(sa.Unicode(30), nullable=False)
+    email = sa.Column(sa.Unicode(40), default=u'nobody@example.com')
+    active = sa.Column(sa.Boolean, default=True)
+
+class Order(Base):
+    __tablename__ = 'orders'
+    id = sa.Column(sa.Integer, primary_key=True)
+    user_id = sa.Column(sa.Integer, sa.ForeignKey('users.id'), nullable=False)
+    quantity = sa.Column(sa.Integer, default=1)
+    user = relation(User, backref='orders')
+
+
+def setup(rows):
+    engine = sa.create_engine('sqlite://')
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    users = [User(name=u'user %d' % i) for i in range(10)]
+    session.add_all(users)
+    session.add_all([Order(user=users[i % 10], quantity=i) for i in range(rows)])
+    session.commit()
+    return session
+
+
+def bench(grid, attr, number=3):
+    rows = list(grid.rows)
+    fields = grid.render_fields.values()
+    def activate():
+        for row in rows:
+            grid._set_active(row)
+    def read():
+        for row in rows:
+            grid._set_active(row)
+            for field in fields:
+                getattr(field, attr)
+    # _set_active alone, subtracted from the timings
+    base = min(timeit.Timer(activate).repeat(number, 1))
+    seconds = min(timeit.Timer(read).repeat(number, 1)) - base
+    reads = len(rows) * len(fields)
+    print '%-12s %9.0f reads/s  (%.2f us/read)' % (attr, reads / seconds, seconds / reads * 1e6)
+
+
+def main(rows=2000):
+    session = setup(rows)
+    saved = session.query(Order).all()
+    new = [Order() for i in range(rows)]
+    for title, instances in (('saved rows', saved), ('new rows (column defaults)', new)):
+        print title
+        grid = Grid(Order, instances, session=session)
+        grid.configure(include=[grid.user, grid.quantity])
+        for attr in ('raw_value', 'model_value', 'value'):
+            bench(grid, attr)
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:]])
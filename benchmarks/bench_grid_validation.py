@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""
+Validating an editable Grid.
+
+Validates `rows` rows of integer, float, date and string columns row by row,
+and column by column (`columnar_validation`). Run with::
+
+    $ python benchmarks/bench_grid_validation.py [rows]
+"""
+import sys
+import time
+import datetime
+
+import sqlalchemy as sa
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.declarative import declarative_base
+
+from formalchemy import Grid, validators
+
+Base = declarative_base()
+
+class Reading(Base):
+    __tablename__ = 'readings'
+    id = sa.Column(sa.Integer, primary_key=True)
+    count = sa.Column(sa.Integer, nullable=False)
+    ratio = sa.Column(sa.Float)
+    day = sa.Column(sa.Date)
+    note = sa.Column(sa.Unicode(20))
+
+
+class RowGrid(Grid):
+    compact_dates = True
+
+class ColumnarGrid(RowGrid):
+    columnar_validation = True
+
+
+def setup(rows):
+    engine = sa.create_engine('sqlite://')
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    session.add_all([Reading(id=i + 1, count=i) for i in range(rows)])
+    session.commit()
+    data = {}
+    for i in range(rows):
+        prefix = 'Reading-%d-' % (i + 1)
+        data[prefix + 'count'] = str(i)
+        data[prefix + 'ratio'] = i % 7 and '%d.5' % i or 'n/a'
+        data[prefix + 'day'] = (datetime.date(2009, 1, 1) + datetime.timedelta(i % 365)).isoformat()
+        data[prefix + 'note'] = u'reading %d' % i
+    return session, data
+
+
+def bench(title, cls, session, data):
+    grid = cls(Reading, session.query(Reading).all(), data=data)
+    grid.configure(include=[grid.count, grid.ratio, grid.day,
+                            grid.note.validate(validators.maxlength(10))])
+    start = time.time()
+    grid.validate()
+    seconds = time.time() - start
+    print '%-20s %8.3f s' % (title, seconds)
+    return grid.errors
+
+
+def summary(errors):
+    return dict([(row.id, dict([(field.key, [str(e) for e in L]) for field, L in row_errors.items()]))
+                 for row, row_errors in errors.items()])
+
+
+def main(rows=5000):
+    session, data = setup(rows)
+    errors = bench('row by row', RowGrid, session, data)
+    columnar_errors = bench('column by column', ColumnarGrid, session, data)
+    assert summary(errors) == summary(columnar_errors)
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:]])
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+"""
+Composite primary key decoding.
+
+Decodes the keys posted by a form with a large collection of composite
+keyed items, with `decode_pk` (current and legacy format) and with
+`simple_eval`. Run with::
+
+    $ python benchmarks/bench_keys.py [keys]
+"""
+import sys
+import timeit
+
+from formalchemy.utils import encode_pk, decode_pk, simple_eval, _pk_cache
+
+
+def bench(title, func, sources, number=3):
+    def decode():
+        _pk_cache.clear()
+        for source in sources:
+            func(source)
+    seconds = min(timeit.Timer(decode).repeat(number, 1))
+    print '%-22s %9.0f keys/s  (%.2f us/key)' % (title, len(sources) / seconds, seconds / len(sources) * 1e6)
+
+
+def main(keys=5000):
+    values = [(i, u'tag %d' % i) for i in range(keys)]
+    encoded = [encode_pk(v) for v in values]
+    legacy = [unicode(repr(v)) for v in values]
+    bench('decode_pk', decode_pk, encoded)
+    bench('decode_pk (legacy)', decode_pk, legacy)
+    bench('simple_eval', simple_eval, legacy)
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:]])
@@ -13,7 +13,10 @@ from sqlalchemy import __version__
 if __version__.split('.') < MIN_SA_VERSION.split('.'):
     raise ImportError('Version %s or later of SQLAlchemy required' % MIN_SA_VERSION)
 
+from weakref import WeakKeyDictionary
+
 from sqlalchemy.orm.attributes import InstrumentedAttribute
+from sqlalchemy.orm.attributes import ScalarAttributeImpl, ScalarObjectAttributeImpl, CollectionAttributeImpl
 from sqlalchemy.orm.properties import SynonymProperty
 from sqlalchemy.orm import compile_mappers, object_session, class_mapper
 from sqlalchemy.orm.session import Session
@@ -24,6 +27,7 @@ from sqlalchemy.util import OrderedDict
 from formalchemy import fields
 from formalchemy import renderers
 from formalchemy import fatypes
+from formalchemy.utils import _pk_getters
 
 compile_mappers() # initializes InstrumentedAttributes
 
@@ -72,6 +76,68 @@ class SimpleMultiDict(dict):
         return v
 
 
+# mapped class -> {attribute key: value of the attribute in a new instance}
+_new_values = WeakKeyDictionary()
+
+def _new_instance_values(cls):
+    try:
+        return _new_values[cls]
+    except KeyError:
+        values = {}
+        for p in class_mapper(cls).iterate_properties:
+            try:
+                impl = _get_attribute(cls, p).impl
+            except (KeyError, AttributeError):
+                continue
+            if isinstance(impl, CollectionAttributeImpl):
+                values[p.key] = []
+            elif isinstance(impl, (ScalarAttributeImpl, ScalarObjectAttributeImpl)):
+                values[p.key] = None
+        _new_values[cls] = values
+        return values
+
+def _init_session(cls):
+    """return the session new instances of `cls` are saved to when they are
+    created (classes mapped with `Session.mapper`), or None"""
+    for extension in getattr(class_mapper(cls).extension, '_extensions', []):
+        if getattr(extension, 'save_on_init', False):
+            return extension.context.registry()
+    return None
+
+
+class _NewModel(object):
+    """
+    Stands in for a new instance of a mapped class bound as a class, until
+    the instance is needed: mapped attributes read as they would in a new
+    instance (None, or an empty collection, so that `raw_value` falls back
+    to column defaults). Reading any other attribute, or setting one,
+    creates the instance through the renderer's `model`.
+    """
+    def __init__(self, renderer, cls):
+        self.__dict__['_renderer'] = renderer
+        self.__dict__['_cls'] = cls
+        self.__dict__['_values'] = _new_instance_values(cls)
+
+    def __class__(self):
+        return self.__dict__['_cls']
+    __class__ = property(__class__)
+
+    def __getattr__(self, attrname):
+        values = self.__dict__['_values']
+        if attrname in values:
+            value = values[attrname]
+            if value is not None:
+                value = list(value)
+            return value
+        return getattr(self.__dict__['_renderer'].model, attrname)
+
+    def __setattr__(self, attrname, value):
+        setattr(self.__dict__['_renderer'].model, attrname, value)
+
+# placeholders stand for new instances, which have no primary key
+_pk_getters[_NewModel] = lambda model: None
+
+
 class ModelRenderer(object):
     """
     The `ModelRenderer` class is the superclass for all classes needing to deal 
@@ -167,6 +233,8 @@ class ModelRenderer(object):
         """
         self._fields = OrderedDict()
         self._render_fields = OrderedDict()
+        # dynamic relations, keyed by name, see __getattr__
+        self._dynamic_attributes = {}
         self.model = self.session = None
         self.prefix = prefix
 
@@ -174,7 +242,7 @@ class ModelRenderer(object):
             raise Exception('model parameter may not be None')
         ModelRenderer.rebind(self, model, session, data)
 
-        cls = isinstance(self.model, type) and self.model or type(self.model)
+        cls = self._model.__class__
         try:
             class_mapper(cls)
         except:
@@ -199,8 +267,10 @@ class ModelRenderer(object):
             attrs = []
             for p in class_mapper(cls).iterate_properties:
                 attr = _get_attribute(cls, p)
-                if ((isinstance(p, SynonymProperty) or attr.property.key not in (s.name for s in synonyms))
-                    and not isinstance(attr.impl, DynamicAttributeImpl)):
+                if isinstance(attr.impl, DynamicAttributeImpl):
+                    # not rendered by default, see __getattr__
+                    self._dynamic_attributes[attr.impl.key] = attr
+                elif isinstance(p, SynonymProperty) or attr.property.key not in (s.name for s in synonyms):
                     attrs.append(attr)
             # sort relations last before storing in the OrderedDict
             L = [fields.AttributeField(attr, self) for attr in attrs]
@@ -349,9 +419,9 @@ class ModelRenderer(object):
         if not (model or session or data):
             raise Exception('must specify at least one of {model, session, data}')
         if not model:
-            if not self.model:
+            if not self._model:
                 raise Exception('model must be specified when none is already set')
-            model = fields._pk(self.model) is None and type(self.model) or self.model
+            model = fields._pk(self._model) is None and self._model.__class__ or self._model
         # copy.copy causes a stacktrace on python 2.5.2/OSX + pylons.  unable to reproduce w/ simpler sample.
         mr = object.__new__(self.__class__)
         mr.__dict__ = dict(self.__dict__)
@@ -371,21 +441,19 @@ class ModelRenderer(object):
            * if `session` is not specified, FA tries to re-guess session from the model
            * if data is not specified, it is rebound to None.
         """
+        if isinstance(model, _NewModel):
+            model = model.__class__
         original_model = model
         if model:
             if isinstance(model, type):
                 try:
-                    model = model()
+                    class_mapper(model)
                 except:
-                    raise Exception('%s appears to be a class, not an instance, but FormAlchemy cannot instantiate it.  (Make sure all constructor parameters are optional!)' % model)
-                # take object out of session, if present
-                try:
-                    _obj_session = object_session(model)
-                except AttributeError:
-                    pass # non-SA object; doesn't need session
+                    model = self._instantiate(model) # non-SA object; doesn't need session
                 else:
-                    if _obj_session:
-                        _obj_session.expunge(model)
+                    # instantiated when needed, see `model`
+                    _obj_session = _init_session(model)
+                    model = _NewModel(self, model)
             elif object_session(model):
                 # for instances of mapped classes, require that the instance have a PK already
                 try:
@@ -395,9 +463,9 @@ class ModelRenderer(object):
                 else:
                     if fields._pk(model) is None:
                         raise Exception('Mapped instances to be bound must either have a primary key set or not be in a Session.  When creating a new object, bind the class instead [i.e., bind(User), not bind(User())]')
-            if self.model and type(self.model) != type(model):
-                raise ValueError('You can only bind to another object of the same type you originally bound to (%s), not %s' % (type(self.model), type(model)))
-            self.model = model
+            if self._model and self._model.__class__ != model.__class__:
+                raise ValueError('You can only bind to another object of the same type you originally bound to (%s), not %s' % (self._model.__class__, model.__class__))
+            self._model = model
             self._bound_pk = fields._pk(model)
 
         # Assign new data
@@ -434,21 +502,52 @@ class ModelRenderer(object):
                         self.session = o_session
         # if we didn't just instantiate (in which case object_session will be None), 
         # the session should be the same as the object_session
-        if self.session and model == original_model:
+        if self.session and model == original_model and not isinstance(self._model, _NewModel):
             try:
-                o_session = object_session(self.model)
+                o_session = object_session(self._model)
             except AttributeError:
                 pass # non-SA object
             else:
                 if o_session and self.session is not o_session:
                     raise Exception('You may not explicitly bind to a session when your model already belongs to a different one')
 
+    def model(self):
+        """
+        The bound model instance. When a mapped class was bound, the new
+        instance is created on first access (or by `sync`); until then,
+        fields read a placeholder standing in for it.
+        """
+        model = self._model
+        if isinstance(model, _NewModel):
+            model = self._model = self._instantiate(model.__class__)
+        return model
+    def _set_model(self, model):
+        self._model = model
+    model = property(model, _set_model)
+
+    def _instantiate(self, cls):
+        try:
+            model = cls()
+        except:
+            raise Exception('%s appears to be a class, not an instance, but FormAlchemy cannot instantiate it.  (Make sure all constructor parameters are optional!)' % cls)
+        # take object out of session, if present
+        try:
+            _obj_session = object_session(model)
+        except AttributeError:
+            pass # non-SA object; doesn't need session
+        else:
+            if _obj_session:
+                _obj_session.expunge(model)
+        return model
+
     def sync(self):
         """
         Sync (copy to the corresponding attributes) the data passed to the constructor or `bind` to the `model`.
         """
         if self.data is None:
             raise Exception("No data bound; cannot sync")
+        # create the instance of a bound class
+        self.model
         for field in self.render_fields.itervalues():
             field.sync()
         if self.session:
@@ -475,7 +574,8 @@ class ModelRenderer(object):
             for field in L:
                 if not isinstance(field, fields.AbstractField):
                     raise TypeError('non-AbstractField object `%s` found in `%s`' % (field, iterable))
-                if field not in self._fields.values():
+                if field not in self._fields.values() and \
+                   not (iterable != 'exclude' and field.key in self._dynamic_attributes):
                     raise ValueError('Unrecognized Field `%s` in `%s` -- did you mean to call append() first?' % (field, iterable))
 
         # if include is given, those are the fields used.  otherwise, include those not explicitly (or implicitly) excluded.
@@ -507,6 +607,10 @@ class ModelRenderer(object):
             try:
                 return self._fields[attrname]
             except KeyError:
+                # dynamic relations, which can be included explicitly
+                dynamic_attributes = self.__dict__.get('_dynamic_attributes', {})
+                if attrname in dynamic_attributes:
+                    return fields.AttributeField(dynamic_attributes[attrname], self)
                 raise AttributeError(attrname)
 
     __getitem__ = __getattr__
@@ -532,6 +636,11 @@ class ModelRenderer(object):
 
 
 class EditableRenderer(ModelRenderer):
+    # maximum number of threads running I/O-bound validators, see
+    # `validators.io_bound`
+    io_workers = 8
+    # stop validating after this many errors, see `AbstractFieldSet.validate`
+    max_errors = None
     default_renderers = {
         fatypes.String: renderers.TextFieldRenderer,
         fatypes.Integer: renderers.IntegerFieldRenderer,
@@ -548,3 +657,10 @@ class EditableRenderer(ModelRenderer):
         'password': renderers.PasswordFieldRenderer,
         'textarea': renderers.TextAreaFieldRenderer,
     }
+
+    def _reset_options(self):
+        """call the options callables of the fields again, see
+        `SelectFieldRenderer._options_index`"""
+        for field in self.render_fields.itervalues():
+            if isinstance(field._renderer, renderers.SelectFieldRenderer):
+                field._renderer._options_index_cache = None
@@ -19,6 +19,16 @@ Here is a simple example::
     >>> from formalchemy import templates
     >>> config.engine = templates.TempitaEngine
 
+Modules keeping a copy of a value can register a listener, called each time
+a value is set::
+
+    >>> def listener(attr, value):
+    ...     print attr, value
+    >>> config.add_listener(listener)
+    >>> config.encoding = 'utf-8'
+    encoding utf-8
+    >>> config._listeners.remove(listener)
+
 There is also a convenience method to set the configuration from a config file::
 
     >>> config.from_config({'formalchemy.encoding':'utf-8',
@@ -38,27 +48,41 @@ class Config(object):
     __doc__ = __doc__
     __name__ = 'formalchemy.config'
     __file__ = __file__
-    __data = dict(
-        encoding='utf-8',
-        engine = templates.default_engine,
-    )
+
+    def __init__(self):
+        # values are plain instance attributes, so reading them does not go
+        # through __getattr__
+        self.__dict__.update(
+            _listeners = [],
+            encoding='utf-8',
+            engine = templates.default_engine,
+        )
 
     def __getattr__(self, attr):
-        if attr in self.__data:
-            return self.__data[attr]
-        else:
-            raise AttributeError('Configuration has no attribute %s' % attr)
+        raise AttributeError('Configuration has no attribute %s' % attr)
 
     def __setattr__(self, attr, value):
         meth = getattr(self, '__set_%s' % attr, None)
         if callable(meth):
             meth(value)
         else:
-            self.__data[attr] = value
+            self.set(attr, value)
+
+    def set(self, attr, value):
+        """set the value of `attr` and notify the listeners"""
+        self.__dict__[attr] = value
+        for listener in self._listeners:
+            listener(attr, value)
+
+    def add_listener(self, listener):
+        """register `listener`, a callable called with `(attr, value)` each
+        time a configuration value is set. Used by modules keeping a copy of
+        a value or caching something depending on it."""
+        self._listeners.append(listener)
 
     def __set_engine(self, value):
         if isinstance(value, templates.TemplateEngine):
-            self.__data['engine'] = value
+            self.set('engine', value)
         else:
             raise ValueError('%s is not a template engine')
 
@@ -85,7 +109,8 @@ class Config(object):
             self.__setattr__(k, v)
 
     def __repr__(self):
-        return "<module 'formalchemy.config' from '%s' with values %s>" % (self.__file__, self.__data)
+        values = dict([(k, v) for k, v in self.__dict__.items() if not k.startswith('_')])
+        return "<module 'formalchemy.config' from '%s' with values %s>" % (self.__file__, values)
 
 sys.modules['formalchemy.config'] = Config()
 
@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+"""
+Import CSV files through a configured `FieldSet` (or `Grid`): each row is
+bound, validated and synced like submitted form data, so the validators and
+relation handling of the form apply::
+
+    >>> from formalchemy.ext.csvimport import import_csv
+    >>> imported, rejected = import_csv(fs, open('cities.csv'), rejects=open('rejects.csv', 'w')) #doctest: +SKIP
+
+Rows are read one at a time and the new objects are committed (and
+expunged from the session) `chunk_size` at a time, so memory use does not
+depend on the size of the file.
+"""
+import csv
+
+from formalchemy import renderers
+from formalchemy.base import SimpleMultiDict
+from formalchemy.forms import FieldSet
+from formalchemy.tables import Grid
+
+__all__ = ['import_csv']
+
+
+def import_csv(fieldset, stream, session=None, columns=None, chunk_size=500,
+               rejects=None, encoding='utf-8', commit=True, **fmtparams):
+    """
+    Create an object of the class of `fieldset` for each valid row of the
+    CSV `stream`, and return the number of `(imported, rejected)` rows.
+
+    - `fieldset`: a configured `FieldSet` or `Grid`. Its fields are the
+      columns which can be imported; `fieldset` itself is not modified.
+
+    - `session`: the session to add the objects to, by default the one of
+      `fieldset`.
+
+    - `columns`: the field names of the columns of the file. By default,
+      they are read from the first row, whose cells may be the key, the
+      name or the label of a field. Columns which are not fields are
+      ignored, and so are fields without a column, unless they are required.
+
+    - `chunk_size`: the number of objects flushed (and committed if
+      `commit` is True) at a time, then expunged from the session. If a
+      flush fails, the session is rolled back and the error raised; the
+      chunks before it have been committed already.
+
+    - `rejects`: a file-like object to write the invalid rows to, as CSV,
+      with the header if any, and their errors in an additional last column.
+
+    - `encoding`: the encoding of `stream` and `rejects`.
+
+    Other keyword arguments are CSV format parameters, as for `csv.reader`.
+
+    Cells are deserialized as submitted form data: dates and times as in
+    `YYYY-MM-DD HH:MM:SS`, relations as the primary key of the related
+    object, and collections as primary keys separated by spaces.
+    """
+    fs = _import_fieldset(fieldset, session)
+    session = fs.session
+    if session is None:
+        raise Exception('No session found.  Either bind a session explicitly, or bind the FieldSet to one.')
+    cls = fs._model.__class__
+    reader = csv.reader(stream, **fmtparams)
+    header = None
+    if columns is None:
+        try:
+            header = reader.next()
+        except StopIteration:
+            return 0, 0
+        columns = [cell.decode(encoding).strip() for cell in header]
+    mapping = _map_columns(fs, columns)
+
+    writer = None
+    if rejects is not None:
+        writer = csv.writer(rejects, **fmtparams)
+        if header is not None:
+            writer.writerow(header + ['errors'])
+
+    imported = rejected = 0
+    chunk = []
+    for row in reader:
+        if not row:
+            continue
+        data = SimpleMultiDict()
+        for index, name, field in mapping:
+            if index < len(row):
+                value = row[index].decode(encoding)
+            else:
+                value = u''
+            if field.is_collection:
+                value = value.split()
+            data[name] = value
+        fs.rebind(cls, session, data)
+        if not fs.validate():
+            rejected += 1
+            if writer is not None:
+                # short rows are padded, to put the errors under their column
+                padding = [''] * (len(columns) - len(row))
+                writer.writerow(row + padding + [_format_errors(fs.errors).encode(encoding)])
+            continue
+        fs.sync()
+        chunk.append(fs.model)
+        imported += 1
+        if len(chunk) == chunk_size:
+            _save(session, chunk, commit)
+            chunk = []
+    if chunk:
+        _save(session, chunk, commit)
+    return imported, rejected
+
+
+def _import_fieldset(fieldset, session):
+    """return a copy of `fieldset` to import with: a FieldSet bound to a new
+    object, whose date and time fields read single inputs"""
+    cls = fieldset._model.__class__
+    if isinstance(fieldset, Grid):
+        fs = FieldSet(cls, session=session or fieldset.session)
+        fields = [field.bind(fs) for field in fieldset.render_fields.itervalues()]
+    else:
+        fs = fieldset.bind(cls, session=session or fieldset.session)
+        fields = fs.render_fields.values()
+    include = []
+    for field in fields:
+        if not field.is_readonly():
+            for type_class, renderer in renderers.compact_renderers.items():
+                if isinstance(field.type, type_class) and not isinstance(field.renderer, renderer):
+                    field = field.with_renderer(renderer)
+                    break
+            include.append(field)
+    fs.configure(include=include)
+    return fs
+
+
+def _map_columns(fs, columns):
+    """return `(column index, input name, field)` for the columns of the
+    fields of `fs`, and configure `fs` to include these fields only"""
+    fields = {}
+    for field in fs.render_fields.itervalues():
+        fields[field.key] = field
+        fields[field.name] = field
+        fields[field.label_text or fs.prettify(field.key)] = field
+    mapping = []
+    for index, column in enumerate(columns):
+        field = fields.get(column)
+        if field is not None:
+            mapping.append((index, field.renderer._name_for(fs._model, None), field))
+    mapped = [field for index, name, field in mapping]
+    for field in fs.render_fields.itervalues():
+        if field not in mapped and field.is_required():
+            raise ValueError('No column for the required field %s' % field.key)
+    fs.configure(include=mapped)
+    return mapping
+
+
+def _format_errors(errors):
+    L = []
+    for field, messages in errors.items():
+        messages = '; '.join([unicode(getattr(m, 'message', m)) for m in messages])
+        if field is None:
+            L.append(messages)
+        else:
+            L.append(u'%s: %s' % (field.key, messages))
+    L.sort()
+    return u' / '.join(L)
+
+
+def _save(session, objects, commit):
+    try:
+        session.flush()
+        if commit:
+            session.commit()
+    except:
+        session.rollback()
+        raise
+    for o in objects:
+        if o in session:
+            session.expunge(o)
@@ -102,6 +102,13 @@ class FileFieldRenderer(Base):
                                  href=self.get_url(value), **kwargs)
         return ''
 
+    def render_text(self, **kwargs):
+        """render the filename and the binary size, without the link"""
+        value = self.field.value
+        if value:
+            return '%s (%s)' % (normalized_basename(value), self.readable_size())
+        return ''
+
     def deserialize(self):
         if self._path:
             return self._path
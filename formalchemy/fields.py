@@ -7,15 +7,20 @@ import logging
 logger = logging.getLogger('formalchemy.' + __name__)
 
 from copy import copy, deepcopy
+from weakref import WeakKeyDictionary
 import warnings
 
-from sqlalchemy.orm import class_mapper
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import class_mapper, object_session
+from sqlalchemy.orm.collections import collection_adapter
+from sqlalchemy.orm.dynamic import DynamicAttributeImpl
 from sqlalchemy.orm.attributes import ScalarAttributeImpl, ScalarObjectAttributeImpl, CollectionAttributeImpl, InstrumentedAttribute
 from sqlalchemy.orm.properties import CompositeProperty, ColumnProperty
 from sqlalchemy.exceptions import InvalidRequestError # 0.4 support
 from formalchemy import fatypes, validators, renderers
+from formalchemy import helpers as h
 from formalchemy.utils import stringify, normalized_options, query_options
-from formalchemy.utils import _pk, _pk_one_column, simple_eval
+from formalchemy.utils import _pk, _pk_one_column, simple_eval, decode_pk, encode_pk, _json_value
 from formalchemy.renderers import *
 
 __all__ = ['Field', 'AbstractField', 'AttributeField'] + renderers.__all__
@@ -31,12 +36,101 @@ def _foreign_keys(property):
 
 def _model_equal(a, b):
     if not isinstance(a, type):
-        a = type(a)
+        a = a.__class__
     if not isinstance(b, type):
-        b = type(b)
+        b = b.__class__
     return a is b
 
 
+# id(renderers mapping) -> (mapping, snapshot of mapping, {type class: renderer})
+_renderer_dispatch = {}
+
+def _renderer_for_type(mapping, type_):
+    """
+    Return the renderer of `mapping` (a `default_renderers` dict) for the
+    field type instance `type_`, or None. The most specific class in the MRO
+    of `type_` wins. Results are cached per mapping, and dropped as soon as
+    the mapping is modified.
+    """
+    entry = _renderer_dispatch.get(id(mapping))
+    if entry is None or entry[0] is not mapping or entry[1] != mapping:
+        if len(_renderer_dispatch) >= 64:
+            _renderer_dispatch.clear()
+        entry = (mapping, dict(mapping), {})
+        _renderer_dispatch[id(mapping)] = entry
+    table = entry[2]
+    cls = type(type_)
+    try:
+        return table[cls]
+    except KeyError:
+        pass
+    renderer = None
+    for t in getattr(cls, '__mro__', ()):
+        if t in mapping:
+            renderer = mapping[t]
+            break
+    else:
+        for t in mapping:
+            if not isinstance(t, basestring) and isinstance(type_, t):
+                renderer = mapping[t]
+                break
+    table[cls] = renderer
+    return renderer
+
+
+def _members(data):
+    """return the submitted members of a collection as a list"""
+    if data is None:
+        return []
+    if isinstance(data, (list, tuple)):
+        return data
+    return [data]
+
+
+def _submitted(data):
+    """return `data` as submitted form data: None or a string"""
+    if data is None or isinstance(data, basestring):
+        return data
+    if isinstance(data, float):
+        return repr(data)
+    return unicode(data)
+
+
+# placeholder for the error of an I/O-bound validator, see `_validate`
+_pending = object()
+
+def _validate_pending(pending, workers):
+    """
+    Run the I/O-bound validators deferred by `AbstractField._validate`
+    concurrently, and replace their placeholders by their error messages,
+    or remove them
+    """
+    if not pending:
+        return
+    calls = [(validator, (value, field)) for errors, i, validator, value, field in pending]
+    results = validators._run_concurrently(calls, workers)
+    lists = {}
+    for (errors, i, validator, value, field), result in zip(pending, results):
+        if isinstance(result, validators.ValidationError):
+            errors[i] = result.message
+        lists[id(errors)] = errors
+    for errors in lists.itervalues():
+        errors[:] = [e for e in errors if e is not _pending]
+
+def _failed(errors):
+    """whether `errors` holds errors other than placeholders of pending
+    validators"""
+    for e in errors:
+        if e is not _pending:
+            return True
+    return False
+
+def _keys_criterion(columns, keys):
+    """return the criterion matching the primary `keys` of `columns`"""
+    if len(columns) == 1:
+        return columns[0].in_(keys)
+    return or_(*[and_(*[c == v for c, v in zip(columns, key)]) for key in keys])
+
 def _cache_deserialize(func):
     """Simple caching decorator"""
     def cache_decorator(self, *args, **kwargs):
@@ -130,6 +224,12 @@ class AbstractField(object):
         are going to be deserialized."""
         self._deserialization_done = False
         self._deserialization_result = None
+        self._reset_renderer_cache()
+
+    def _reset_renderer_cache(self):
+        """Forget the name and value memoised by the renderer, if any"""
+        if isinstance(self._renderer, renderers.FieldRenderer):
+            self._renderer._reset_cache()
 
     def __deepcopy__(self, memo):
         wrapper = copy(self)
@@ -155,7 +255,13 @@ class AbstractField(object):
             raise Exception("No session found.  Either bind a session explicitly, or specify relation options manually so FormAlchemy doesn't try to autoload them.")
         return self.parent.session.query(*args, **kwargs)
 
-    def _validate(self):
+    def _validate(self, pending=None):
+        """
+        Validate the submitted value. If `pending` is a list, I/O-bound
+        validators are not run: a placeholder is put in `errors` instead, and
+        `(errors, index, validator, value, field)` appended to `pending`, to
+        be run by `_validate_pending`.
+        """
         if self.is_readonly():
             return True
 
@@ -169,12 +275,13 @@ class AbstractField(object):
             self.errors.append(e)
             return False
 
-        L = list(self.validators)
-        if self.is_required() and validators.required not in L:
-            L.append(validators.required)
-        for validator in L:
+        for validator in self._all_validators():
             if validator is not validators.required and value is None:
                 continue
+            if pending is not None and getattr(validator, 'io_bound', False):
+                self.errors.append(_pending)
+                pending.append((self.errors, len(self.errors) - 1, validator, value, self))
+                continue
             try:
                 validator(value, self)
             except validators.ValidationError, e:
@@ -187,6 +294,132 @@ class AbstractField(object):
                     self.errors.append(e.message)
         return not self.errors
 
+    def _validate_column(self, models, pks=None):
+        """
+        Validate the submitted values of this field for each of `models` at
+        once (`pks` being their primary keys, if known), the way `_validate`
+        validates the value for the bound model.
+        Return a list of `(value, errors)` pairs, where value is the
+        deserialized value (None if it could not be deserialized), or None
+        if the renderer or a validator of this field cannot work this way
+        (see `Grid.columnar_validation`).
+        """
+        if self.is_readonly() or self.is_collection:
+            return None
+        read = renderers._column_reader(self.renderer)
+        if read is None:
+            return None
+        for validator in self._all_validators():
+            if not hasattr(validator, 'batch'):
+                return None
+        renderer = self.renderer
+        if pks is None:
+            pks = [_pk(model) for model in models]
+        name_for = renderer._name_for
+        names = [name_for(model, pk) for model, pk in zip(models, pks)]
+        return self._validate_values(read(self.parent.data, names), models)
+
+    def _all_validators(self):
+        L = list(self.validators)
+        if self.is_required() and validators.required not in L:
+            L.append(validators.required)
+        return L
+
+    def _deserialize_values(self, column):
+        """
+        Deserialize a list of submitted values (lists of values for
+        collections) as the renderer does. Values which are not strings are
+        converted to strings first, see `_submitted`. Return the list of
+        values, with the ValidationError raised for the values which could
+        not be.
+        """
+        if not self.is_collection:
+            return self._deserialize_scalars(column)
+        column = [_members(data) for data in column]
+        members = []
+        for data in column:
+            members.extend(data)
+        members = iter(self._deserialize_scalars(members))
+        values = []
+        for data in column:
+            value = [members.next() for member in data]
+            for member in value:
+                if isinstance(member, validators.ValidationError):
+                    value = member
+                    break
+            values.append(value)
+        return values
+
+    def _deserialize_scalars(self, column):
+        return self.renderer._deserialize_column([_submitted(data) for data in column])
+
+    def _batchable(self):
+        """
+        Whether `_validate_values` validates the same way as `_validate`:
+        the renderer deserializes the default way, and the validators have
+        a `batch` version or are I/O-bound (other validators may read other
+        fields of the parent)
+        """
+        cls = self.renderer.__class__
+        try:
+            if cls.deserialize.im_func is not renderers.FieldRenderer.deserialize.im_func or \
+               cls._deserialize.im_func is not renderers.FieldRenderer._deserialize.im_func:
+                return False
+        except AttributeError:
+            return False
+        for validator in self._all_validators():
+            if not (hasattr(validator, 'batch') or getattr(validator, 'io_bound', False)):
+                return False
+        return True
+
+    def _validate_values(self, column, models=None, records=None):
+        """
+        Deserialize and validate a list of submitted values, as `_validate`
+        does for the bound data, with the `batch` version of validators which
+        have one. `models` are the objects the values are submitted for, or
+        `records` the records they are read from (see
+        `FieldSet.validate_records`), if any; they are given to the `batch`
+        functions which have a true `uses_models` attribute. Return a list of
+        `(value, errors)` pairs, where value is None if it could not be
+        deserialized.
+        """
+        values = self._deserialize_values(column)
+        errors = []
+        valid = []
+        for i, value in enumerate(values):
+            if isinstance(value, validators.ValidationError):
+                errors.append([value])
+                values[i] = None
+            else:
+                errors.append([])
+                valid.append(i)
+        for validator in self._all_validators():
+            if validator is validators.required:
+                indexes = valid
+            else:
+                indexes = [i for i in valid if values[i] is not None]
+            if getattr(validator, 'io_bound', False):
+                calls = [(validator, (values[i], self)) for i in indexes]
+                results = validators._run_concurrently(calls, self.parent.io_workers)
+                for i, result in zip(indexes, results):
+                    if isinstance(result, validators.ValidationError):
+                        errors[i].append(result.message)
+                continue
+            batch = getattr(validator, 'batch', None) or validators._batch(validator)
+            args = ([values[i] for i in indexes], self)
+            if getattr(batch, 'uses_models', False):
+                if models is not None:
+                    args += ([models[i] for i in indexes],)
+                else:
+                    args += (None,)
+                if records is not None:
+                    args += ([records[i] for i in indexes],)
+            results = batch(*args)
+            for i, result in zip(indexes, results):
+                if isinstance(result, validators.ValidationError):
+                    errors[i].append(result.message)
+        return zip(values, errors)
+
     def is_required(self):
         """True iff this Field must be given a non-empty value"""
         return validators.required in self.validators
@@ -196,7 +429,8 @@ class AbstractField(object):
         return self._readonly
 
     def model(self):
-        return self.parent.model
+        # may be a placeholder for a new instance, see `ModelRenderer.model`
+        return self.parent._model
     model = property(model)
 
     def _modified(self, **kwattrs):
@@ -411,12 +645,20 @@ class AbstractField(object):
         """
         Return the field with all configuration changes reverted.
         """
-        return deepcopy(self.parent._fields[self.name])
+        try:
+            return deepcopy(self.parent._fields[self.name])
+        except KeyError:
+            # dynamic relations are not among the fields, see
+            # `ModelRenderer.__getattr__`
+            dynamic = self.parent._dynamic_attributes.get(self.key)
+            if dynamic is None:
+                raise
+            return AttributeField(dynamic, self.parent)
 
     def _get_renderer(self):
-        for t in self.parent.default_renderers:
-            if not isinstance(t, basestring) and isinstance(self.type, t):
-                return self.parent.default_renderers[t]
+        renderer = _renderer_for_type(self.parent.default_renderers, self.type)
+        if renderer is not None:
+            return renderer
         raise TypeError(
                 'No renderer found for field %s. '
                 'Type %s as no default renderer' % (self.name, self.type))
@@ -452,6 +694,8 @@ class AbstractField(object):
         """
         if self.is_readonly():
             return self.render_readonly()
+        # the model may have changed since the last rendering
+        self._reset_renderer_cache()
 
         opts = self._get_render_opts()
 
@@ -465,8 +709,75 @@ class AbstractField(object):
         """
         Render this Field as HTML for read only mode.
         """
+        self._reset_renderer_cache()
         return self.renderer.render_readonly(**self._get_render_opts())
 
+    def render_text(self):
+        """
+        Render the value of this Field as plain text, without html, as
+        `Grid.export_csv` does. See `FieldRenderer.render_text`.
+        """
+        self._reset_renderer_cache()
+        return self.renderer.render_text(**self._get_render_opts())
+
+    def to_dict(self):
+        """
+        Return this Field as a dict of values `json` can encode, for clients
+        rendering forms themselves: `name` (of the input), `key`, `label`,
+        `type` (the name of the type class), `required`, `readonly`,
+        `value`, `options` (a list of `[label, value]` pairs, or None) and
+        `errors` (a list of messages).
+
+        `value` is the `value` of the Field (the submitted value, if any,
+        else the model value, with primary keys for relations), or the
+        submitted string if it cannot be deserialized. Dates and times are
+        ISO 8601 strings. It is None for renderers whose `masked` attribute
+        is True, such as passwords.
+        """
+        d = self._column_dict()
+        d.update(self._cell_dict())
+        return d
+
+    def _column_dict(self):
+        """the part of `to_dict` which does not depend on the model"""
+        return {'key': self.key,
+                'label': self.label_text or self.parent.prettify(self.key),
+                'type': self.type.__class__.__name__,
+                'required': self.is_required(),
+                'readonly': self.is_readonly(),
+                'options': self._json_options()}
+
+    def _cell_dict(self):
+        """the part of `to_dict` which depends on the model"""
+        if getattr(self.renderer, 'masked', False):
+            value = None
+        else:
+            try:
+                value = self.value
+            except validators.ValidationError:
+                value = self.renderer._value
+        errors = [stringify(getattr(e, 'message', e)) for e in self.errors]
+        return {'name': self.renderer.name,
+                'value': _json_value(value),
+                'errors': errors}
+
+    def _json_options(self):
+        options = self.render_opts.get('options')
+        if options is None:
+            return None
+        if callable(options):
+            options = normalized_options(options(self.parent))
+        L = []
+        for option in options:
+            if isinstance(option, (list, tuple)):
+                if tuple(option) == self._null_option:
+                    continue
+                label, value = option[0], option[1]
+            else:
+                label = value = option
+            L.append([stringify(label), _json_value(value)])
+        return L
+
     def _pkify(self, value):
         """return the PK for value, if applicable"""
         return value
@@ -601,6 +912,7 @@ class Field(AbstractField):
         """Set the attribute's value in `model` to the value given in `data`"""
         if not self.is_readonly():
             self._value = self._deserialize()
+            self._reset_renderer_cache()
 
     def __repr__(self):
         return 'AttributeField(%s)' % self.name
@@ -616,6 +928,99 @@ class Field(AbstractField):
         return hash(self.name)
 
 
+class _AttributeSpec(object):
+    """
+    Facts about a mapped attribute that do not depend on the model instance
+    or the parent FieldSet, computed once and shared by all the
+    `AttributeField` of that attribute.
+    """
+    def __init__(self, impl, property):
+        from sqlalchemy.sql.expression import _Label
+        try:
+            from sqlalchemy.sql.expression import Function
+        except ImportError:
+            from sqlalchemy.sql.expression import _Function as Function
+
+        if isinstance(impl, ScalarObjectAttributeImpl):
+            # If the attribute is a foreign key, use the Column that this
+            # attribute is mapped from -- e.g., .user -> .user_id.
+            columns = _foreign_keys(property)
+        elif isinstance(impl, ScalarAttributeImpl) or impl.__class__.__name__ in ('ProxyImpl', '_ProxyImpl'): # 0.4 compatibility: ProxyImpl is a one-off class for each synonym, can't import it
+            # normal property, mapped to a single column from the main table
+            columns = property.columns
+        else:
+            # collection -- use the mapped class's PK
+            assert isinstance(impl, (CollectionAttributeImpl, DynamicAttributeImpl)), impl.__class__
+            columns = property.mapper.primary_key
+        # the mapped column(s)
+        self.columns = columns
+        # True iff the attribute is mapped to a label (read-only)
+        self.is_label = isinstance(columns[0], _Label)
+        # scalar default of the column, or None. callables often depend on
+        # the current time, e.g. datetime.now or the equivalent SQL function.
+        # these are meant to be the value *at insertion time*, so it's not
+        # strictly correct to generate a value at form-edit time.
+        self.default = None
+        if len(columns) == 1 and getattr(columns[0], 'default', None):
+            # Sequences have no arg
+            arg = getattr(columns[0].default, 'arg', None)
+            if not (callable(arg) or isinstance(arg, Function)):
+                self.default = arg
+        # turns a submitted key into a python key: for multicolumn keys, we
+        # turn the string into python via FA's utils.decode_pk; otherwise,
+        # the key is just the raw deserialized value (which is already an
+        # int, etc., as necessary)
+        if len(columns) > 1:
+            self.python_pk = decode_pk
+        else:
+            self.python_pk = _identity
+        # see _plain_secondary
+        self.secondary = None
+        if isinstance(impl, CollectionAttributeImpl):
+            self.secondary = _plain_secondary(property)
+
+def _plain_secondary(property):
+    """
+    If `property` is a many-to-many relation through a table holding nothing
+    but the foreign keys, return `(table, parent pairs, child columns)`, where
+    parent pairs are `(parent column, table column)` pairs and child columns
+    the table columns referencing the related primary key, in order.
+    Otherwise return None.
+    """
+    table = getattr(property, 'secondary', None)
+    if table is None or property.viewonly:
+        return None
+    parent_pairs = list(property.synchronize_pairs)
+    child_pairs = list(property.secondary_synchronize_pairs)
+    child_columns = []
+    for pk in property.mapper.primary_key:
+        for child, column in child_pairs:
+            if child is pk:
+                child_columns.append(column)
+                break
+        else:
+            return None
+    used = [column for parent, column in parent_pairs] + child_columns
+    for column in table.c:
+        if not [c for c in used if c is column]:
+            return None
+    return table, parent_pairs, child_columns
+
+def _identity(value):
+    return value
+
+# AttributeImpl -> _AttributeSpec
+_attribute_specs = WeakKeyDictionary()
+
+def _attribute_spec(instrumented_attribute):
+    impl = instrumented_attribute.impl
+    try:
+        return _attribute_specs[impl]
+    except KeyError:
+        spec = _attribute_specs[impl] = _AttributeSpec(impl, instrumented_attribute.property)
+        return spec
+
+
 class AttributeField(AbstractField):
     """
     Field corresponding to an SQLAlchemy attribute.
@@ -624,6 +1029,12 @@ class AttributeField(AbstractField):
     object. Default data will be taken from the table definitions. Raw
     model values will be taken from the model objects.
     """
+    # see keys_only
+    _keys_only = False
+    _keys_label = None
+    # (page, items per page) of the members of a dynamic relation to render
+    _page = (1, 50)
+
     def __init__(self, instrumented_attribute, parent):
         """
             >>> from formalchemy.tests import FieldSet, Order
@@ -642,9 +1053,16 @@ class AttributeField(AbstractField):
         # property is the PropertyLoader which handles all the interesting stuff.
         # mapper, columns, and foreign keys are all located there.
         self._property = instrumented_attribute.property
+        # static facts about the attribute, shared with the other fields of
+        # the same attribute
+        self._spec = _attribute_spec(instrumented_attribute)
+
+        # True iff this is a dynamic relation (lazy='dynamic' or
+        # dynamic_loader), whose members are read through a query
+        self.is_dynamic = isinstance(self._impl, DynamicAttributeImpl)
 
         # True iff this is a multi-valued (one-to-many or many-to-many) SA relation
-        self.is_collection = isinstance(self._impl, CollectionAttributeImpl)
+        self.is_collection = isinstance(self._impl, CollectionAttributeImpl) or self.is_dynamic
 
         # True iff this is the 'one' end of a one-to-many relation
         self.is_scalar_relation = isinstance(self._impl, ScalarObjectAttributeImpl)
@@ -680,7 +1098,7 @@ class AttributeField(AbstractField):
         # single-valued SA relation properties. For example, for order.user,
         # name will be 'user_id' (assuming that is indeed the name of the foreign
         # key to users), but for user.orders, name will be 'orders'.
-        if self.is_collection or self.is_composite or not hasattr(self.model, self._column_name):
+        if self.is_collection or self.is_composite or not hasattr(self.model.__class__, self._column_name):
             self.name = self.key
         else:
             self.name = self._column_name
@@ -690,21 +1108,68 @@ class AttributeField(AbstractField):
             self.validators.append(validators.required)
 
     def is_readonly(self):
-        from sqlalchemy.sql.expression import _Label
-        return AbstractField.is_readonly(self) or isinstance(self._columns[0], _Label)
+        return AbstractField.is_readonly(self) or self._spec.is_label
+
+    def keys_only(self, label=None):
+        """
+        Read the primary keys of the members of this collection with a query
+        on their primary key columns, instead of loading the collection.
+        `label`, a column or mapped attribute of the related class (e.g.
+        `Order.quantity`), is read the same way to render the field
+        read-only; without it, read-only rendering loads the collection to
+        display its members. Collections already loaded on the model, e.g.
+        modified ones, are used as is::
+
+            fs.configure(include=[fs.orders.keys_only(label=Order.quantity)])
+        """
+        if not self.is_collection:
+            raise ValueError('keys_only() only applies to collections, not %s' % self)
+        return self._modified(_keys_only=True, _keys_label=label)
+
+    def _keys_readable(self):
+        """True if the members of the collection are read with queries, see
+        `keys_only`"""
+        return self._keys_only and not self.is_dynamic and \
+               self.key not in self.model.__dict__ and _pk(self.model) is not None
+
+    def paginate(self, page=1, items_per_page=50):
+        """
+        Render page `page` of the members of a dynamic relation
+        (`lazy='dynamic'` or `dynamic_loader`), `items_per_page` members a
+        page. Dynamic relations are not part of the default fields, but can be
+        included explicitly, and render the first 50 members by default::
+
+            fs.configure(include=[fs.messages.paginate(page=2, items_per_page=20)])
+
+        Unless options are given, the members of the page are the options of
+        the field. Only these members are removed when they are deselected,
+        and submitted keys which are not members yet are added.
+        """
+        if not self.is_dynamic:
+            raise ValueError('paginate() only applies to dynamic relations, not %s' % self)
+        return self._modified(_page=(page, items_per_page))
+
+    def _page_query(self):
+        """return the query of the rendered page of a dynamic relation"""
+        page, items_per_page = self._page
+        q = getattr(self.model, self.key)
+        q = q.order_by(list(class_mapper(self.relation_type()).primary_key))
+        return q.limit(items_per_page).offset((page - 1) * items_per_page)
+
+    def _keys_query(self, *columns):
+        """
+        Return the rows of `columns` (of the related class) for the members
+        of the collection, or None if they must be read from the collection.
+        """
+        if not self._keys_readable():
+            return None
+        cls = self.relation_type()
+        order_by = self._property.order_by or list(class_mapper(cls).primary_key)
+        q = self.query(cls).with_parent(self.model, self.key).order_by(order_by)
+        return list(q.values(*columns))
 
     def _columns(self):
-        if self.is_scalar_relation:
-            # If the attribute is a foreign key, return the Column that this
-            # attribute is mapped from -- e.g., .user -> .user_id.
-            return _foreign_keys(self._property)
-        elif isinstance(self._impl, ScalarAttributeImpl) or self._impl.__class__.__name__ in ('ProxyImpl', '_ProxyImpl'): # 0.4 compatibility: ProxyImpl is a one-off class for each synonym, can't import it
-            # normal property, mapped to a single column from the main table
-            return self._property.columns
-        else:
-            # collection -- use the mapped class's PK
-            assert self.is_collection, self._impl.__class__
-            return self._property.mapper.primary_key
+        return self._spec.columns
     _columns = property(_columns)
 
     def relation_type(self):
@@ -723,38 +1188,195 @@ class AttributeField(AbstractField):
         return value
 
     def model_value(self):
+        rows = self._keys_query(*self._columns)
+        if rows is not None:
+            if len(self._columns) == 1:
+                return [row[0] for row in rows]
+            return [tuple(row) for row in rows]
         return self._pkify(self.raw_value)
     model_value = property(model_value)
 
+    def render_readonly(self):
+        text = self._keys_text()
+        if text is not None:
+            return text
+        return AbstractField.render_readonly(self)
+
+    def render_text(self):
+        text = self._keys_text()
+        if text is not None:
+            return text
+        return AbstractField.render_text(self)
+
+    def _keys_text(self):
+        """the labels of the related objects read with `_keys_label`, or
+        None"""
+        if self._keys_label is not None:
+            rows = self._keys_query(self._keys_label)
+            if rows is not None:
+                return u', '.join([stringify(row[0]) for row in rows])
+        return None
+
     def raw_value(self):
+        if self.is_dynamic:
+            if _pk(self.model) is None:
+                return []
+            return self._page_query().all()
         try:
             v = getattr(self.model, self.name)
         except AttributeError:
             v = getattr(self.model, self.key)
         if v is not None:
             return v
-
-        _columns = self._columns
-        if len(_columns) == 1 and  _columns[0].default:
-            try:
-                from sqlalchemy.sql.expression import Function
-            except ImportError:
-                from sqlalchemy.sql.expression import _Function as Function
-            arg = _columns[0].default.arg
-            if callable(arg) or isinstance(arg, Function):
-                # callables often depend on the current time, e.g. datetime.now or the equivalent SQL function.
-                # these are meant to be the value *at insertion time*, so it's not strictly correct to
-                # generate a value at form-edit time.
-                pass
-            else:
-                return arg
-        return None
+        return self._spec.default
     raw_value = property(raw_value)
 
     def sync(self):
         """Set the attribute's value in `model` to the value given in `data`"""
         if not self.is_readonly():
-            setattr(self.model, self.name, self._deserialize())
+            if self.is_dynamic:
+                self._sync_dynamic()
+            elif self.is_collection and _pk(self.model) is not None:
+                self._sync_collection()
+            else:
+                setattr(self.model, self.name, self._deserialize())
+            self._reset_renderer_cache()
+
+    def _submitted_members(self):
+        """return the submitted collection as a list of `(pk, object)`
+        pairs, where object is None if it has not been loaded yet"""
+        if self._deserialization_done:
+            return [(_pk(item), item) for item in self._deserialization_result]
+        python_pk = self._spec.python_pk
+        return [(python_pk(pk), None) for pk in self.renderer.deserialize()]
+
+    def _sync_collection(self):
+        """
+        Apply the submitted collection to the model as a delta: the members
+        added or removed are appended to or removed from the collection,
+        which is loaded, but the members kept are left alone and only the
+        added ones are queried. For collections read with `keys_only`
+        through a plain association table, the rows of that table are
+        inserted and deleted directly, without loading the collection at
+        all.
+        """
+        submitted = self._submitted_members()
+        session = self.parent.session
+        if self._spec.secondary is not None and session is not None and \
+           object_session(self.model) is session and self._keys_readable():
+            parent_values = self._secondary_parent_values()
+            if parent_values is not None:
+                self._sync_secondary(session, parent_values, [key for key, item in submitted])
+                return
+        adapter = collection_adapter(getattr(self.model, self.key))
+        members = dict([(_pk(item), item) for item in adapter])
+        wanted = dict(submitted)
+        for key, item in members.items():
+            if key not in wanted:
+                adapter.remove_with_event(item)
+        for key, item in submitted:
+            if key not in members:
+                if item is None:
+                    item = self.query(self.relation_type()).get(key)
+                adapter.append_with_event(item)
+                members[key] = item
+
+    def _sync_dynamic(self):
+        """
+        Apply the submitted members of a dynamic relation: members of the
+        rendered page (whose keys are submitted with the page, see
+        `render`) which were not submitted are removed, submitted keys
+        which are not members yet are added. The relation is never loaded
+        as a whole, and members which were not rendered are never removed.
+        """
+        submitted = self._submitted_members()
+        wanted = dict(submitted)
+        appender = getattr(self.model, self.key)
+        columns = list(class_mapper(self.relation_type()).primary_key)
+        removed = [key for key in self._rendered_page() if key not in wanted]
+        if removed:
+            for item in appender.filter(_keys_criterion(columns, removed)):
+                appender.remove(item)
+        if not submitted:
+            return
+        # submitted keys may be members outside of the rendered page
+        existing = dict([(tuple(row), True) for row in
+                         appender.filter(_keys_criterion(columns, wanted.keys())).values(*columns)])
+        for key, item in submitted:
+            if len(columns) == 1:
+                row = (key,)
+            else:
+                row = key
+            if row in existing:
+                continue
+            if item is None:
+                item = self.query(self.relation_type()).get(key)
+            appender.append(item)
+            existing[row] = True
+
+    def _page_name(self):
+        """the name of the inputs holding the keys of the rendered page of a
+        dynamic relation"""
+        return self.renderer.name + u'-page'
+
+    def _rendered_page(self):
+        """return the keys of the members of the page of a dynamic relation
+        which was rendered, as submitted with the data"""
+        if self.parent.data is None:
+            return []
+        page = self.parent.data.getall(self._page_name())
+        if not page:
+            return []
+        python_pk = self._spec.python_pk
+        keys = self._deserialize_values([page])[0]
+        if isinstance(keys, validators.ValidationError):
+            return []
+        return [python_pk(key) for key in keys]
+
+    def _secondary_parent_values(self):
+        """return the `(association table column, value)` pairs for the
+        model, or None if they are not its primary key"""
+        table, parent_pairs, child_columns = self._spec.secondary
+        mapper = class_mapper(self.model.__class__)
+        pk = dict(zip(mapper.primary_key, mapper.primary_key_from_instance(self.model)))
+        parent_values = []
+        for parent, column in parent_pairs:
+            if parent not in pk:
+                return None
+            parent_values.append((column, pk[parent]))
+        return parent_values
+
+    def _sync_secondary(self, session, parent_values, keys):
+        table, parent_pairs, child_columns = self._spec.secondary
+        if len(child_columns) == 1:
+            keys = [(key,) for key in keys]
+        current = dict([(tuple(row), True) for row in self._keys_query(*self._columns)])
+        wanted = dict([(key, True) for key in keys])
+        removed = [key for key in current if key not in wanted]
+        added = [key for key in wanted if key not in current]
+        if removed:
+            if len(child_columns) == 1:
+                condition = child_columns[0].in_([key[0] for key in removed])
+            else:
+                condition = or_(*[and_(*[c == v for c, v in zip(child_columns, key)])
+                                  for key in removed])
+            criterion = [column == value for column, value in parent_values]
+            session.execute(table.delete(and_(condition, *criterion)))
+        if added:
+            parent_params = [(column.key, value) for column, value in parent_values]
+            session.execute(table.insert(),
+                            [dict(parent_params + [(c.key, v) for c, v in zip(child_columns, key)])
+                             for key in added])
+        session.expire(self.model, [self.key])
+        # the other side of the relation, for the related objects loaded
+        mapper = class_mapper(self.relation_type())
+        backrefs = [prop.key for prop in mapper.iterate_properties
+                    if getattr(prop, 'secondary', None) is table and prop is not self._property]
+        if backrefs:
+            for key in removed + added:
+                item = session.identity_map.get(mapper.identity_key_from_primary_key(list(key)))
+                if item is not None:
+                    session.expire(item, backrefs)
 
     def __eq__(self, other):
         # we override eq so that when we configure with options=[...], we can match the renders in options
@@ -772,7 +1394,31 @@ class AttributeField(AbstractField):
     def render(self):
         if self.is_readonly():
             return self.render_readonly()
-        if self.is_relation and self.render_opts.get('options') is None:
+        if self.is_dynamic and self.render_opts.get('options') is None:
+            self._reset_renderer_cache()
+            # the options are the members of the page, which depend on the model
+            if isinstance(self.renderer, self.parent.default_renderers['dropdown']):
+                self.render_opts['multiple'] = True
+                if 'size' not in self.render_opts:
+                    self.render_opts['size'] = 5
+            opts = self._get_render_opts()
+            opts['options'] = query_options(self.raw_value)
+            # the keys of the page, so that sync only removes members which
+            # were rendered, even if the page has changed in the meantime
+            name = self._page_name()
+            page = [h.hidden_field(name, encode_pk(value), id=None)
+                    for label, value in opts['options']]
+            return self.renderer.render(**opts) + u''.join(page)
+        self._load_options()
+        if self.is_collection and isinstance(self.renderer, self.parent.default_renderers['dropdown']):
+            self.render_opts['multiple'] = True
+            if 'size' not in self.render_opts:
+                self.render_opts['size'] = 5
+        return AbstractField.render(self)
+
+    def _load_options(self):
+        """set the options of relations to the related objects"""
+        if self.is_relation and not self.is_dynamic and self.render_opts.get('options') is None:
             if self.is_required() or self.is_collection:
                 self.render_opts['options'] = []
             else:
@@ -783,27 +1429,45 @@ class AttributeField(AbstractField):
             q = self.query(fk_cls).order_by(order_by)
             self.render_opts['options'] += query_options(q)
             logger.debug('options for %s are %s' % (self.name, self.render_opts['options']))
-        if self.is_collection and isinstance(self.renderer, self.parent.default_renderers['dropdown']):
-            self.render_opts['multiple'] = True
-            if 'size' not in self.render_opts:
-                self.render_opts['size'] = 5
-        return AbstractField.render(self)
+
+    def _json_options(self):
+        self._load_options()
+        return AbstractField._json_options(self)
+
+    def _cell_dict(self):
+        d = AbstractField._cell_dict(self)
+        if self.is_dynamic and self.render_opts.get('options') is None:
+            # the options are the members of the page, as when rendering
+            d['options'] = [[label, _json_value(value)]
+                            for label, value in query_options(self.raw_value)]
+        return d
 
     def _get_renderer(self):
         if self.is_relation:
             return self.parent.default_renderers['dropdown']
         return AbstractField._get_renderer(self)
 
+    def _validate_column(self, models, pks=None):
+        if self.is_composite_foreign_key:
+            return None
+        return AbstractField._validate_column(self, models, pks)
+
+    def _deserialize_values(self, column):
+        # keys of related objects are not looked up
+        values = AbstractField._deserialize_values(self, column)
+        python_pk = self._spec.python_pk
+        if python_pk is _identity or not (self.is_collection or self.is_composite_foreign_key):
+            return values
+        for i, value in enumerate(values):
+            if isinstance(value, list):
+                values[i] = [python_pk(pk) for pk in value]
+            elif isinstance(value, basestring):
+                values[i] = python_pk(value)
+        return values
+
     @_cache_deserialize
     def _deserialize(self):
-        # for multicolumn keys, we turn the string into python via
-        # FA's utils.simple_eval; otherwise, the key is just the raw
-        # deserialized value (which is already an int, etc., as necessary)
-        if len(self._columns) > 1:
-            python_pk = simple_eval
-        else:
-            python_pk = lambda st: st
-
+        python_pk = self._spec.python_pk
         if self.is_collection:
             return [self.query(self.relation_type()).get(python_pk(pk)) for pk in self.renderer.deserialize()]
         if self.is_composite_foreign_key:
@@ -10,6 +10,7 @@ logger = logging.getLogger('formalchemy.' + __name__)
 import base, fields
 from validators import ValidationError
 from formalchemy import config
+from formalchemy.utils import stringify, _json_module
 
 from tempita import Template as TempitaTemplate # must import after base
 
@@ -92,28 +93,142 @@ class AbstractFieldSet(base.EditableRenderer):
         base.EditableRenderer.configure(self, pk, exclude, include, options)
         self.validator = global_validator
 
+    def rebind(self, model=None, session=None, data=None):
+        """See `ModelRenderer.rebind`"""
+        base.EditableRenderer.rebind(self, model, session, data)
+        # the options may differ for the new model or request
+        self._reset_options()
+
     def validate(self):
         """
         Validate attributes and `global_validator`.
         If validation fails, the validator should raise `ValidationError`.
+
+        Set `max_errors` (on the instance or the class) to stop validating
+        once that many fields have errors, e.g. 1 to fail fast: the other
+        fields are left without errors, and the global validator is only run
+        if the fields are valid.
         """
         if self.data is None:
             raise Exception('Cannot validate without binding data')
-        success = True
+        # I/O-bound validators run concurrently once the others have run
+        pending = []
+        results = []
+        failed = 0
         for field in self.render_fields.itervalues():
-            success = field._validate() and success
+            if self.max_errors is not None and failed >= self.max_errors:
+                field.errors = []
+                continue
+            valid = field._validate(pending)
+            results.append((field, valid))
+            if not valid and fields._failed(field.errors):
+                failed += 1
+        fields._validate_pending(pending, self.io_workers)
+        success = True
+        for field, valid in results:
+            if not valid and field.errors:
+                success = False
         # run this _after_ the field validators, since each field validator
         # resets its error list. we want to allow the global validator to add
         # errors to individual fields.
         if self.validator:
             self._errors = []
-            try:
-                self.validator(self)
-            except ValidationError, e:
-                self._errors = e.args
-                success = False
+            if success or self.max_errors is None:
+                try:
+                    self.validator(self)
+                except ValidationError, e:
+                    self._errors = e.args
+                    success = False
         return success
 
+    def validate_records(self, records, chunk_size=500):
+        """
+        Validate plain dicts of submitted values keyed by field name (as in
+        `fs.name`), such as records of a JSON or bulk API, without binding
+        them. Yield a `(values, errors)` pair for each record: `values` is a
+        dict of the deserialized values of the fields which are valid, and
+        `errors` a dict of the error messages of the fields which are not,
+        both keyed by field name::
+
+            for values, errors in fs.validate_records(records):
+                ...
+
+        Values (lists of values for collections) are deserialized as
+        submitted form data is, after converting values which are not
+        strings, such as JSON numbers, with `unicode` (`repr` for floats).
+        Missing values are None. Related objects are not loaded: relations
+        and collections yield their primary keys.
+
+        Records are processed `chunk_size` at a time, with the `batch`
+        version of the validators, so any number of records can be validated
+        in constant memory. The fields whose renderer overrides `deserialize`,
+        or which have validators without a `batch` version (which may read
+        other fields of `field.parent`), are validated as the FieldSet
+        validates submitted data instead: each record is bound to a copy of
+        the FieldSet, as data submitted under the input names of the fields.
+        The global validator does not apply.
+        """
+        fields = [field for field in self.render_fields.itervalues() if not field.is_readonly()]
+        chunk = []
+        for record in records:
+            chunk.append(record)
+            if len(chunk) == chunk_size:
+                for result in self._validate_chunk(fields, chunk):
+                    yield result
+                chunk = []
+        if chunk:
+            for result in self._validate_chunk(fields, chunk):
+                yield result
+
+    def _validate_chunk(self, fields, records):
+        columns = []
+        bound = []
+        for field in fields:
+            if field._batchable():
+                columns.append((field.key, field._validate_values([record.get(field.key) for record in records], records=records)))
+            else:
+                bound.append(field.key)
+        if bound:
+            columns.extend(self._validate_bound(fields, bound, records))
+        for i in xrange(len(records)):
+            values = {}
+            errors = {}
+            for key, column in columns:
+                value, field_errors = column[i]
+                if field_errors:
+                    errors[key] = [getattr(e, 'message', e) for e in field_errors]
+                else:
+                    values[key] = value
+            yield values, errors
+
+    def _validate_bound(self, record_fields, keys, records):
+        """
+        Validate the fields of `keys` for each of `records`, bound to a copy
+        of this FieldSet as submitted data, and return a `(key, column)`
+        pair for each, as `_validate_values` does
+        """
+        cls = self._model.__class__
+        fs = self.bind(cls, session=self.session)
+        names = [(field.key, fs.render_fields[field.key].renderer.name, field.is_collection)
+                 for field in record_fields]
+        columns = [(key, []) for key in keys]
+        for record in records:
+            data = base.SimpleMultiDict()
+            for key, name, is_collection in names:
+                value = record.get(key)
+                if is_collection:
+                    data[name] = [fields._submitted(member) for member in fields._members(value)]
+                elif value is not None:
+                    data[name] = fields._submitted(value)
+            fs.rebind(cls, self.session, data)
+            for key, column in columns:
+                field = fs.render_fields[key]
+                if field._validate():
+                    column.append((field.renderer.deserialize(), []))
+                else:
+                    column.append((None, field.errors))
+        return columns
+
     def errors(self):
         """
         A dictionary of validation failures.  Always empty before `validate()` is run.
@@ -128,6 +243,19 @@ class AbstractFieldSet(base.EditableRenderer):
         return errors
     errors = property(errors)
 
+    def to_dict(self):
+        """
+        Return the FieldSet as data rather than HTML: a dict with the
+        `to_dict()` of each field of `render_fields` under `fields`, and the
+        global errors under `errors`.
+        """
+        return {'fields': [field.to_dict() for field in self.render_fields.itervalues()],
+                'errors': [stringify(getattr(e, 'message', e)) for e in self._errors]}
+
+    def to_json(self, **kwargs):
+        """Return `to_dict()` encoded by `json.dumps`, which takes `kwargs`"""
+        return _json_module().dumps(self.to_dict(), **kwargs)
+
     def insert_after(self, after_what, field):
         """Insert a field to be rendered after a given field.
 
@@ -215,9 +343,11 @@ class FieldSet(AbstractFieldSet):
         AbstractFieldSet.sync(self)
 
     def render(self, **kwargs):
-        if fields._pk(self.model) != self._bound_pk and self.data is not None:
+        if fields._pk(self._model) != self._bound_pk and self.data is not None:
             raise Exception('Primary key of model has changed since binding, probably due to sync()ing a new instance.  You can solve this by either binding to a model with the original primary key again, or by binding data to None.')
         engine = self.engine or config.engine
+        # call options callables again for each render
+        self._reset_options()
         if self._render or self._render_readonly:
             warnings.warn(DeprecationWarning('_render and _render_readonly are deprecated and will be removed in 1.5. Use a TemplateEngine instead'))
         if self.readonly:
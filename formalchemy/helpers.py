@@ -264,26 +264,135 @@ def options_for_select(container, selected=None):
     """
     if hasattr(container, 'values'):
         container = container.items()
-    
-    if not isinstance(selected, (list, tuple)):
-        selected = (selected,)
-    
-    options = []
-    
+    return option_list(container).render(selected)
+
+
+class OptionList(object):
+    """
+    A list of options normalised and HTML-escaped once. `render` only has to
+    mark the selected options, which it does through a value -> positions
+    index, so the cost of a selection no longer depends on the number of
+    options times the number of selected values.
+
+    Instances are immutable and shared; use `option_list` to get one.
+    """
+    def __init__(self, container):
+        self.values = []
+        self._plain = []
+        self._selected = []
+        self._positions = {}
+        for i, elem in enumerate(container):
+            if isinstance(elem, (list, tuple)):
+                name, value = elem
+                n = html_escape(name)
+                v = html_escape(value)
+            else:
+                name = value = elem
+                n = v = html_escape(elem)
+            self.values.append(value)
+            self._plain.append('<option value="%s">%s</option>' % (v, n))
+            self._selected.append('<option value="%s" selected="selected">%s</option>' % (v, n))
+            if self._positions is None:
+                continue
+            try:
+                self._positions.setdefault(value, []).append(i)
+            except TypeError:
+                # unhashable value, only reachable through a linear scan
+                self._positions = None
+        self._html = "\n".join(self._plain)
+
+    def __len__(self):
+        return len(self.values)
+
+    def _selected_positions(self, selected):
+        if self._positions is None:
+            return [i for i, value in enumerate(self.values) if value in selected]
+        positions = []
+        for value in selected:
+            try:
+                positions.extend(self._positions.get(value, ()))
+            except TypeError:
+                # unhashable selected value: compare it against every option
+                positions.extend([i for i, v in enumerate(self.values) if v == value])
+        return positions
+
+    def render(self, selected=None):
+        """return the option tags, with `selected` (a value or a list of
+        values) marked as selected"""
+        if not isinstance(selected, (list, tuple)):
+            selected = (selected,)
+        positions = self._selected_positions(selected)
+        if not positions:
+            return self._html
+        options = list(self._plain)
+        for i in positions:
+            options[i] = self._selected[i]
+        return "\n".join(options)
+
+
+_option_lists = {}
+_OPTION_LISTS_MAX = 256
+
+def _option_list_key(container):
+    # types are part of the key: 1, 1.0 and True are equal but do not render
+    # the same way
+    key = []
     for elem in container:
         if isinstance(elem, (list, tuple)):
             name, value = elem
-            n = html_escape(name)
-            v = html_escape(value)
-        else :
-            name = value = elem
-            n = v = html_escape(elem)
-        
-        if value in selected:
-            options.append('<option value="%s" selected="selected">%s</option>' % (v, n))
-        else :
-            options.append('<option value="%s">%s</option>' % (v, n))
-    return "\n".join(options)
+            key.append((type(name), name, type(value), value))
+        else:
+            key.append((type(elem), elem))
+    return tuple(key)
+
+def option_list(container):
+    """
+    Return the (cached) `OptionList` for `container`, an iterable of
+    `(name, value)` pairs or of single values. Lists with the same content
+    share the same escaped options, so static lists and the options of a
+    dropdown repeated on each `Grid` row are only escaped once.
+    """
+    if isinstance(container, OptionList):
+        return container
+    container = list(container)
+    try:
+        key = _option_list_key(container)
+        options = _option_lists.get(key)
+    except TypeError:
+        # unhashable content, can't be cached
+        return OptionList(container)
+    if options is None:
+        if len(_option_lists) >= _OPTION_LISTS_MAX:
+            _option_lists.clear()
+        options = _option_lists[key] = OptionList(container)
+    return options
+
+_js_escapes = {'\\': '\\\\', '"': '\\"', '\n': '\\n', '\r': '\\r',
+               '<': '\\u003c', '>': '\\u003e', '&': '\\u0026'}
+
+def js_string(value):
+    """
+    Return `value` as a double quoted javascript string literal, safe to
+    include in html.
+
+        >>> print js_string(u'"</script>" & \\xe9')
+        "\\"\\u003c/script\\u003e\\" \\u0026 \\u00e9"
+    """
+    if value is None:
+        value = u''
+    if not isinstance(value, basestring):
+        value = unicode(value)
+    elif not isinstance(value, unicode):
+        value = value.decode('utf-8')
+    L = []
+    for ch in value:
+        if ch in _js_escapes:
+            L.append(_js_escapes[ch])
+        elif ord(ch) < 32 or ord(ch) > 126:
+            L.append('\\u%04x' % ord(ch))
+        else:
+            L.append(str(ch))
+    return '"%s"' % ''.join(L)
 
 if __name__=="__main__":
     import doctest
@@ -22,6 +22,12 @@ class _Translator(object):
     def gettext(self, value):
         return value
 
+_dummy_translator = _Translator()
+
+# catalogs are parsed once per file, and the same instance is returned for a
+# given language so that the translator can be used as a cache key
+_translations = {}
+
 def get_translator(lang=None):
     """
     return a GNUTranslations instance for `lang`::
@@ -52,11 +58,13 @@ def get_translator(lang=None):
     for lang in langs:
         filename = os.path.join(i18n_path, lang, 'LC_MESSAGES','formalchemy.mo')
         if os.path.isfile(filename):
-            translations_path = os.path.join(i18n_path, lang, 'LC_MESSAGES','formalchemy.mo')
-            return GNUTranslations(open(translations_path, 'rb'))
+            translations = _translations.get(filename)
+            if translations is None:
+                translations = _translations[filename] = GNUTranslations(open(filename, 'rb'))
+            return translations
 
     # dummy translator
-    return _Translator()
+    return _dummy_translator
 
 def _(value):
     """dummy 'translator' to mark translation strings in python code"""
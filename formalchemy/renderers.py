@@ -13,7 +13,7 @@ from formalchemy import helpers as h
 from formalchemy.i18n import get_translator
 from formalchemy.i18n import _
 from formalchemy import fatypes, validators
-from formalchemy.utils import stringify, normalized_options, simple_eval
+from formalchemy.utils import stringify, normalized_options, simple_eval, encode_pk
 # Removed to prevent circular imports
 #from formalchemy.fields import AbstractField
 
@@ -23,7 +23,9 @@ __all__ = ['FieldRenderer', 'SelectFieldRenderer',
            'DateFieldRenderer', 'TimeFieldRenderer',
            'DateTimeFieldRenderer', 'EscapingReadonlyRenderer',
            'CheckBoxFieldRenderer', 'CheckBoxSet', 'RadioSet',
-           'FileFieldRenderer', 'IntegerFieldRenderer']
+           'FileFieldRenderer', 'IntegerFieldRenderer',
+           'CompactDateFieldRenderer', 'CompactTimeFieldRenderer',
+           'CompactDateTimeFieldRenderer', 'SharedSelectFieldRenderer']
 
 
 def iterable(item):
@@ -33,6 +35,32 @@ def iterable(item):
         return False
     return True
 
+def _date(data):
+    if data == 'YYYY-MM-DD' or data == '-MM-DD' or not data.strip():
+        return None
+    try:
+        return datetime.date(*[int(st) for st in data.split('-')])
+    except:
+        raise validators.ValidationError('Invalid date')
+
+def _time(data):
+    if data == 'HH:MM:SS' or not data.strip():
+        return None
+    try:
+        return datetime.time(*[int(st) for st in data.split(':')])
+    except:
+        raise validators.ValidationError('Invalid time')
+
+def _datetime(data):
+    data_date, data_time = data.split(' ', 1)
+    dt, tm = _date(data_date), _time(data_time)
+    if dt is None and tm is None:
+        return None
+    elif dt is None or tm is None:
+        raise validators.ValidationError('Incomplete datetime')
+    return datetime.datetime(dt.year, dt.month, dt.day, tm.hour, tm.minute, tm.second)
+
+
 class FieldRenderer(object):
     """
     This should be the super class of all Renderer classes.
@@ -44,6 +72,15 @@ class FieldRenderer(object):
     Subclasses should override `render` and `deserialize`.
     See their docstrings for details.
     """
+    # (key, value) pairs memoising `name` and `_value` for the bound row.
+    # Always replaced, never mutated, since renderers are copied along with
+    # their fields.
+    _name_cache = None
+    _value_cache = None
+    # True if the value must not be shown, as `render_readonly` does: then
+    # `Field.to_dict` gives no value either
+    masked = False
+
     def __init__(self, field):
         self.field = field
         # REMOVED: FieldRender.__init__ only called by AbstractField.renderer
@@ -84,8 +121,23 @@ class FieldRenderer(object):
         get the field's `name` HTML attribute, both when rendering
         and deserializing.
         """
-        clsname = self.field.model.__class__.__name__
-        pk = self.field.parent._bound_pk
+        field = self.field
+        parent = field.parent
+        pk = parent._bound_pk
+        cache = self._name_cache
+        if cache is not None:
+            key = cache[0]
+            if key[0] is field and key[1] is field.model and \
+               key[2] == pk and key[3] == parent.prefix:
+                return cache[1]
+        name = self._name_for(field.model, pk)
+        self._name_cache = ((field, field.model, pk, parent.prefix), name)
+        return name
+    name = property(name)
+
+    def _name_for(self, model, pk):
+        """return the name of the input for `model`, whose primary key is `pk`"""
+        clsname = model.__class__.__name__
         assert pk != ''
         if isinstance(pk, basestring) or not iterable(pk):
             pk_string = stringify(pk)
@@ -100,22 +152,38 @@ class FieldRenderer(object):
         if self.field.parent.prefix:
             components.insert(0, self.field.parent.prefix)
         return u"-".join(components)
-    name = property(name)
 
     def _value(self):
         """
         Submitted value, or field value converted to string.
         Return value is always either None or a string.
+
+        The result is memoised for the rendering of the field: it is read
+        again when the field is rendered again, bound to another model or
+        data, or synced.
         """
+        field = self.field
+        cache = self._value_cache
+        if cache is not None:
+            key = cache[0]
+            if key[0] is field and key[1] is field.model and \
+               key[2] is field.parent.data and key[3] == self.name:
+                return cache[1]
         if not self.field.is_readonly() and self.params is not None:
             # submitted value.  do not deserialize here since that requires valid data, which we might not have
             v = self._serialized_value() 
         else:
             v = None
         # empty field will be '' -- use default value there, too
-        return v or self._model_value_as_string()
+        value = v or self._model_value_as_string()
+        self._value_cache = ((field, field.model, field.parent.data, self.name), value)
+        return value
     _value = property(_value)
 
+    def _reset_cache(self):
+        """Forget the memoised `name` and `_value`"""
+        self._name_cache = self._value_cache = None
+
     def _model_value_as_string(self):
         if self.field.model_value is None:
             return None
@@ -177,6 +245,16 @@ class FieldRenderer(object):
             return value
         return stringify(value)
 
+    def render_text(self, **kwargs):
+        """
+        render the field value as plain text, without html, for exports such
+        as `Grid.export_csv`. The default is the text of the default
+        `render_readonly`, so renderers whose own `render_readonly` outputs
+        markup (a link, for instance) are exported as their value; override
+        it to format the value otherwise.
+        """
+        return FieldRenderer.render_readonly(self, **kwargs)
+
     def params(self):
         """This gives access to the POSTed data, as received from
         the web user. You should call `.getone`, or `.getall` to 
@@ -300,41 +378,59 @@ class FieldRenderer(object):
                 return validators.decimal_(data, self)
             else:
                 return validators.float_(data, self)
-
-        def _date(data):
-            if data == 'YYYY-MM-DD' or data == '-MM-DD' or not data.strip():
-                return None
-            try:
-                return datetime.date(*[int(st) for st in data.split('-')])
-            except:
-                raise validators.ValidationError('Invalid date')
-        def _time(data):
-            if data == 'HH:MM:SS' or not data.strip():
-                return None
-            try:
-                return datetime.time(*[int(st) for st in data.split(':')])
-            except:
-                raise validators.ValidationError('Invalid time')
-
         if isinstance(self.field.type, fatypes.Date):
             return _date(data)
         if isinstance(self.field.type, fatypes.Time):
             return _time(data)
         if isinstance(self.field.type, fatypes.DateTime):
-            data_date, data_time = data.split(' ')
-            dt, tm = _date(data_date), _time(data_time)
-            if dt is None and tm is None:
-                return None
-            elif dt is None or tm is None:
-                raise validators.ValidationError('Incomplete datetime')
-            return datetime.datetime(dt.year, dt.month, dt.day, tm.hour, tm.minute, tm.second)
-
+            return _datetime(data)
         return data
 
+    def _deserialize_column(self, column):
+        """
+        `_deserialize` a list of submitted values at once, returning for
+        each value the deserialized value, or the ValidationError raised.
+        Used by `Grid.columnar_validation`.
+        """
+        type_ = self.field.type
+        if isinstance(type_, fatypes.Boolean):
+            return validators._batch(lambda data, field: self._deserialize(data))(column)
+        null = self.field._null_option[1]
+        values = []
+        for data in column:
+            if data == null:
+                data = None
+            values.append(data)
+        if isinstance(type_, fatypes.Integer):
+            return validators.integer.batch(values, self)
+        if isinstance(type_, fatypes.Float):
+            return validators.float_.batch(values, self)
+        if isinstance(type_, fatypes.Numeric):
+            if type_.asdecimal:
+                return validators.decimal_.batch(values, self)
+            else:
+                return validators.float_.batch(values, self)
+        for type_class, parse in ((fatypes.Date, _date), (fatypes.Time, _time), (fatypes.DateTime, _datetime)):
+            if isinstance(type_, type_class):
+                results = []
+                for data in values:
+                    if data is None:
+                        results.append(None)
+                        continue
+                    try:
+                        results.append(parse(data))
+                    except validators.ValidationError, e:
+                        results.append(e)
+                return results
+        return values
+
     def __repr__(self):
         return '<%s for %r>' % (self.__class__.__name__, self.field)
     
     def stringify_value(self, v):
+        if isinstance(v, tuple):
+            # composite primary key
+            return encode_pk(v)
         return stringify(v, null_value=self.field._null_option[1])
 
 class EscapingReadonlyRenderer(FieldRenderer):
@@ -355,6 +451,13 @@ class EscapingReadonlyRenderer(FieldRenderer):
     def render_readonly(self, **kwargs):
         return h.html_escape(self._renderer.render_readonly(**kwargs))
 
+    def render_text(self, **kwargs):
+        return self._renderer.render_text(**kwargs)
+
+    def masked(self):
+        return self._renderer.masked
+    masked = property(masked)
+
 
 class TextFieldRenderer(FieldRenderer):
     """render a field as a text field"""
@@ -380,10 +483,13 @@ class FloatFieldRenderer(FieldRenderer):
 
 class PasswordFieldRenderer(TextFieldRenderer):
     """Render a password field"""
+    masked = True
     def render(self, **kwargs):
         return h.password_field(self.name, value=self._value, maxlength=self.length, **kwargs)
     def render_readonly(self):
         return '*'*6
+    def render_text(self, **kwargs):
+        return PasswordFieldRenderer.render_readonly(self)
 
 class TextAreaFieldRenderer(FieldRenderer):
     """render a field as a textarea"""
@@ -399,6 +505,8 @@ class HiddenFieldRenderer(FieldRenderer):
         return h.hidden_field(self.name, value=self._value, **kwargs)
     def render_readonly(self):
         return ''
+    def render_text(self, **kwargs):
+        return ''
 
 
 class CheckBoxFieldRenderer(FieldRenderer):
@@ -455,6 +563,9 @@ class FileFieldRenderer(FieldRenderer):
         """
         return self.readable_size()
 
+    def render_text(self, **kwargs):
+        return FileFieldRenderer.render_readonly(self, **kwargs)
+
     def deserialize(self):
         data = FieldRenderer.deserialize(self)
         if isinstance(data, cgi.FieldStorage):
@@ -479,6 +590,45 @@ def _ternary(condition, first, second):
         return first()
     return second()
 
+# placeholder for the input name in precomputed widgets
+_NAME = '\x00'
+
+class _SelectWidget(object):
+    """A select box whose HTML is computed once, minus the name of the input
+    and the selected option"""
+    def __init__(self, options, **kwargs):
+        self.options = h.option_list(options)
+        html = h.select(_NAME, '', **kwargs)
+        self._head = html[:-len('</select>')]
+
+    def render(self, name, selected=None):
+        return '%s%s</select>' % (self._head.replace(_NAME, h.escape_once(name)),
+                                  self.options.render(selected))
+
+_select_widgets = {}
+_SELECT_WIDGETS_MAX = 512
+
+def _select_widget(key, options, kwargs):
+    """return the `_SelectWidget` for `key` (the kind of widget and everything
+    its options depend on, e.g. the translator) and the html `kwargs`.
+    `options` is a callable returning the option list, only called the first
+    time a widget is built."""
+    try:
+        key = key + tuple(sorted(kwargs.items()))
+        widget = _select_widgets.get(key)
+    except TypeError:
+        # unhashable html options
+        return _SelectWidget(options(), **kwargs)
+    if widget is None:
+        if len(_select_widgets) >= _SELECT_WIDGETS_MAX:
+            _select_widgets.clear()
+        widget = _select_widgets[key] = _SelectWidget(options(), **kwargs)
+    return widget
+
+_day_options = [(i, str(i)) for i in xrange(1, 32)]
+_hour_options = [(i, str(i)) for i in xrange(24)]
+_minute_options = [(i, str(i)) for i in xrange(60)]
+
 class DateFieldRenderer(FieldRenderer):
     """Render a date field"""
     format = '%Y-%m-%d'
@@ -486,11 +636,13 @@ class DateFieldRenderer(FieldRenderer):
     def render_readonly(self, **kwargs):
         value = self.field.raw_value
         return value and value.strftime(self.format) or ''
+    def render_text(self, **kwargs):
+        return DateFieldRenderer.render_readonly(self, **kwargs)
     def _render(self, **kwargs):
         data = self.params
         F_ = self.get_translator(**kwargs)
-        month_options = [(F_('Month'), 'MM')] + [(F_('month_%02i' % i), str(i)) for i in xrange(1, 13)]
-        day_options = [(F_('Day'), 'DD')] + [(i, str(i)) for i in xrange(1, 32)]
+        month_select = _select_widget(('month', F_), lambda: [(F_('Month'), 'MM')] + [(F_('month_%02i' % i), str(i)) for i in xrange(1, 13)], kwargs)
+        day_select = _select_widget(('day', F_), lambda: [(F_('Day'), 'DD')] + _day_options, kwargs)
         mm_name = self.name + '__month'
         dd_name = self.name + '__day'
         yyyy_name = self.name + '__year'
@@ -502,8 +654,8 @@ class DateFieldRenderer(FieldRenderer):
         else:
             yyyy = str(self.field.model_value and self.field.model_value.year or 'YYYY')
         selects = dict(
-                m=h.select(mm_name, h.options_for_select(month_options, selected=mm), **kwargs),
-                d=h.select(dd_name, h.options_for_select(day_options, selected=dd), **kwargs),
+                m=month_select.render(mm_name, mm),
+                d=day_select.render(dd_name, dd),
                 y=h.text_field(yyyy_name, value=yyyy, maxlength=4, size=4, **kwargs))
         value = [selects.get(l) for l in self.edit_format.split('-')]
         return ' '.join(value)
@@ -520,20 +672,22 @@ class TimeFieldRenderer(FieldRenderer):
     def render_readonly(self, **kwargs):
         value = self.field.raw_value
         return value and value.strftime(self.format) or ''
+    def render_text(self, **kwargs):
+        return TimeFieldRenderer.render_readonly(self, **kwargs)
     def _render(self, **kwargs):
         data = self.params
-        hour_options = ['HH'] + [(i, str(i)) for i in xrange(24)]
-        minute_options = ['MM' ] + [(i, str(i)) for i in xrange(60)]
-        second_options = ['SS'] + [(i, str(i)) for i in xrange(60)]
+        hour_select = _select_widget(('hour',), lambda: ['HH'] + _hour_options, kwargs)
+        minute_select = _select_widget(('minute',), lambda: ['MM'] + _minute_options, kwargs)
+        second_select = _select_widget(('second',), lambda: ['SS'] + _minute_options, kwargs)
         hh_name = self.name + '__hour'
         mm_name = self.name + '__minute'
         ss_name = self.name + '__second'
         hh = _ternary((data is not None and hh_name in data), lambda: data[hh_name], lambda: str(self.field.model_value and self.field.model_value.hour))
         mm = _ternary((data is not None and mm_name in data), lambda: data[mm_name], lambda: str(self.field.model_value and self.field.model_value.minute))
         ss = _ternary((data is not None and ss_name in data), lambda: data[ss_name], lambda: str(self.field.model_value and self.field.model_value.second))
-        return h.select(hh_name, h.options_for_select(hour_options, selected=hh), **kwargs) \
-               + ':' + h.select(mm_name, h.options_for_select(minute_options, selected=mm), **kwargs) \
-               + ':' + h.select(ss_name, h.options_for_select(second_options, selected=ss), **kwargs)
+        return hour_select.render(hh_name, hh) \
+               + ':' + minute_select.render(mm_name, mm) \
+               + ':' + second_select.render(ss_name, ss)
     def render(self, **kwargs):
         return h.content_tag('span', self._render(**kwargs), id=self.name)
 
@@ -551,6 +705,70 @@ class DateTimeFieldRenderer(DateFieldRenderer, TimeFieldRenderer):
         return DateFieldRenderer._serialized_value(self) + ' ' + TimeFieldRenderer._serialized_value(self)
 
 
+class CompactDateFieldRenderer(DateFieldRenderer):
+    """Render a date field as a single input instead of three. Submitted
+    values are expected as `YYYY-MM-DD`, what HTML5 `date` inputs send, and
+    are validated like any other date. Set `input_type` to 'text' for a plain
+    text input."""
+    input_type = 'date'
+    def _model_value_as_string(self):
+        value = self.field.model_value
+        if value is None:
+            return None
+        return value.isoformat()
+    def render(self, **kwargs):
+        return h.text_field(self.name, value=self._value, type=self.input_type, **kwargs)
+
+    def _serialized_value(self):
+        return FieldRenderer._serialized_value(self)
+
+
+class CompactTimeFieldRenderer(TimeFieldRenderer):
+    """Render a time field as a single input (`HH:MM:SS` or `HH:MM`). See
+    `CompactDateFieldRenderer`."""
+    input_type = 'time'
+    def _model_value_as_string(self):
+        value = self.field.model_value
+        if value is None:
+            return None
+        return value.replace(microsecond=0).isoformat()
+    def render(self, **kwargs):
+        return h.text_field(self.name, value=self._value, type=self.input_type, **kwargs)
+
+    def _serialized_value(self):
+        return FieldRenderer._serialized_value(self)
+
+
+class CompactDateTimeFieldRenderer(DateTimeFieldRenderer):
+    """Render a date time field as a single input, accepting both
+    `YYYY-MM-DD HH:MM:SS` and the `YYYY-MM-DDTHH:MM` sent by HTML5
+    `datetime-local` inputs. See `CompactDateFieldRenderer`."""
+    input_type = 'datetime-local'
+    def _model_value_as_string(self):
+        value = self.field.model_value
+        if value is None:
+            return None
+        return value.replace(microsecond=0).isoformat()
+    def render(self, **kwargs):
+        return h.text_field(self.name, value=self._value, type=self.input_type, **kwargs)
+
+    def _serialized_value(self):
+        value = FieldRenderer._serialized_value(self)
+        if value is None:
+            return None
+        value = value.strip().replace('T', ' ')
+        if value and ' ' not in value:
+            # no time part: let deserialization report an incomplete datetime
+            value += ' '
+        return value
+
+compact_renderers = {
+    fatypes.Date: CompactDateFieldRenderer,
+    fatypes.Time: CompactTimeFieldRenderer,
+    fatypes.DateTime: CompactDateTimeFieldRenderer,
+}
+
+
 def _extract_options(options):
     if isinstance(options, dict):
         options = options.items()
@@ -606,6 +824,9 @@ class CheckBoxSet(RadioSet):
 
 class SelectFieldRenderer(FieldRenderer):
     """render a field as select"""
+    # (key, value to label dict), see `_options_index`
+    _options_index_cache = None
+
     def _serialized_value(self):
         if self.name not in self.params:
             if self.field.is_collection:
@@ -613,7 +834,9 @@ class SelectFieldRenderer(FieldRenderer):
             return None
         return FieldRenderer._serialized_value(self)
 
-    def render(self, options, **kwargs):
+    def _option_list(self, options):
+        """return `options` as a list of `(label, value)` pairs, or of values,
+        converted to strings"""
         if callable(options):
             L = normalized_options(options(self.field.parent))
             if not self.field.is_required() and not self.field.is_collection:
@@ -625,19 +848,36 @@ class SelectFieldRenderer(FieldRenderer):
                 L = [(k, self.stringify_value(v)) for k, v in L]
             else:
                 L = [stringify(k) for k in L]
+        return L
+
+    def render(self, options, **kwargs):
+        L = self._option_list(options)
         return h.select(self.name, h.options_for_select(L, selected=self._value), **kwargs)
 
-    def render_readonly(self, options=None, **kwargs):
-        """render a string representation of the field value.
-           Try to retrieve a value from `options`
+    def _options_index(self, options):
         """
-        if not options or self.field.is_scalar_relation:
-            return FieldRenderer.render_readonly(self)
+        Return a dict mapping option values to their labels. The dict is
+        reused as long as `options` is the same object. The result of an
+        options callable is reused for all the rows of a `Grid` render, and
+        by a `FieldSet` until it is rendered or rebound again.
+        """
+        if callable(options):
+            from formalchemy.tables import Grid
+            parent = self.field.parent
+            if isinstance(parent, Grid):
+                key = (options, parent, parent.rows, None)
+            else:
+                # not `model`, which would create a new instance
+                key = (options, parent, parent._model, None)
+        else:
+            key = (options, None, None, None)
+        cache = self._options_index_cache
+        if cache is not None:
+            cached_key = cache[0]
+            if cached_key[0] is key[0] and cached_key[1] is key[1] and \
+               cached_key[2] is key[2] and cached_key[3] is key[3]:
+                return cache[1]
 
-        value = self.field.raw_value
-        if value is None:
-            return ''
- 
         if callable(options):
             L = normalized_options(options(self.field.parent))
         else:
@@ -649,7 +889,106 @@ class SelectFieldRenderer(FieldRenderer):
             else:
                 L = [(k, stringify(k)) for k in L]
         D = dict(L)
+        self._options_index_cache = (key, D)
+        return D
+
+    def render_readonly(self, options=None, **kwargs):
+        """render a string representation of the field value.
+           Try to retrieve a value from `options`
+        """
+        if not options or self.field.is_scalar_relation:
+            return FieldRenderer.render_readonly(self)
+
+        value = self.field.raw_value
+        if value is None:
+            return ''
+ 
+        D = self._options_index(options)
         if isinstance(value, list):
             return u', '.join([stringify(D.get(item, item)) for item in value])
         return stringify(D.get(value, value))
+
+    def render_text(self, options=None, **kwargs):
+        return SelectFieldRenderer.render_readonly(self, options, **kwargs)
  
+
+
+class SharedSelectFieldRenderer(SelectFieldRenderer):
+    """
+    Render a select box carrying only its selected option(s). The full option
+    list of the column is rendered once per `Grid`, by
+    `Grid.render_shared_options`, in a script filling all the select boxes of
+    the column. Names and values are the same as with `SelectFieldRenderer`,
+    so submitted data is deserialized the same way.
+
+    Used for the dropdowns of Grids with `shared_options = True`. Rows whose
+    options differ from the ones of the first row, and fields outside of such
+    a Grid, get a regular select box.
+    """
+    def render(self, options, **kwargs):
+        shared = getattr(self.field.parent, '_shared_options', None)
+        if shared is None:
+            return SelectFieldRenderer.render(self, options, **kwargs)
+        L = self._option_list(options)
+        components = [self.field.model.__class__.__name__, self.field.name]
+        if self.field.parent.prefix:
+            components.insert(0, self.field.parent.prefix)
+        key = u'-'.join(components)
+        if key not in shared:
+            shared[key] = L
+        elif shared[key] != L:
+            return SelectFieldRenderer.render(self, L, **kwargs)
+        value = self._value
+        if not isinstance(value, (list, tuple)):
+            value = [value]
+        selected = set([v for v in value if v is not None])
+        options = []
+        for o in L:
+            if isinstance(o, (list, tuple)):
+                if o[1] in selected:
+                    options.append(o)
+            elif o in selected:
+                options.append(o)
+        L = options
+        kwargs['data-options'] = key
+        return h.select(self.name, h.options_for_select(L, selected=self._value), **kwargs)
+
+
+def _read_column(params, names):
+    getone = params.getone
+    return [getone(name) for name in names]
+
+def _read_column_or_none(params, names):
+    getone = params.getone
+    values = []
+    for name in names:
+        if name in params:
+            values.append(getone(name))
+        else:
+            values.append(None)
+    return values
+
+# _serialized_value implementations reading the single input of a field, ->
+# function reading that input of many rows, see `_column_reader`
+_column_readers = {
+    FieldRenderer._serialized_value.im_func: _read_column,
+    CompactDateFieldRenderer._serialized_value.im_func: _read_column,
+    CompactTimeFieldRenderer._serialized_value.im_func: _read_column,
+    RadioSet._serialized_value.im_func: _read_column_or_none,
+    SelectFieldRenderer._serialized_value.im_func: _read_column_or_none,
+}
+
+def _column_reader(renderer):
+    """
+    return a function reading the submitted values of the field rendered by
+    `renderer` for a list of input names, or None if the renderer does not
+    deserialize a single input the default way
+    """
+    cls = renderer.__class__
+    try:
+        if cls.deserialize.im_func is not FieldRenderer.deserialize.im_func or \
+           cls._deserialize.im_func is not FieldRenderer._deserialize.im_func:
+            return None
+        return _column_readers.get(cls._serialized_value.im_func)
+    except AttributeError:
+        return None
@@ -3,16 +3,47 @@
 # This module is part of FormAlchemy and is released under
 # the MIT License: http://www.opensource.org/licenses/mit-license.php
 
+import csv
+from cStringIO import StringIO
+
 import helpers as h
 
 from formalchemy import config
 from formalchemy import base
+from formalchemy import fields
+from formalchemy import renderers
+from formalchemy import validators
+from formalchemy.utils import stringify, _pk, _json_value, _json_module
 
 from tempita import Template as TempitaTemplate # must import after base
+from sqlalchemy.orm import class_mapper
+from sqlalchemy.util import OrderedDict
 
 
 __all__ = ["Grid"]
 
+_shared_options_script = """<script type="text/javascript">
+//<![CDATA[
+(function() {
+  var O = {%s};
+  var S = document.getElementsByTagName("select");
+  for (var i = 0; i < S.length; i++) {
+    var s = S[i], L = O[s.getAttribute("data-options")];
+    if (!L) continue;
+    var selected = {};
+    for (var j = 0; j < s.options.length; j++)
+      if (s.options[j].selected) selected[s.options[j].value] = true;
+    s.options.length = 0;
+    for (var j = 0; j < L.length; j++) {
+      var o = new Option(L[j][0], L[j][1]);
+      o.selected = selected[L[j][1]] === true;
+      s.options[s.options.length] = o;
+    }
+  }
+})();
+//]]>
+</script>"""
+
 def _validate_iterable(o):
     try:
         iter(o)
@@ -20,6 +51,12 @@ def _validate_iterable(o):
         raise Exception('instances must be an iterable, not %s' % o)
 
 
+def _encode(value, encoding):
+    if isinstance(value, unicode):
+        return value.encode(encoding)
+    return str(value)
+
+
 class Grid(base.EditableRenderer):
     """
     Besides `FieldSet`, `FormAlchemy` provides `Grid` for editing and
@@ -45,14 +82,56 @@ class Grid(base.EditableRenderer):
     whose value is similar to the `errors` from a `FieldSet`, that is, a
     dictionary whose keys are `Field`s, and whose values are
     `ValidationError` instances.
+
+    Set `compact_dates` to True (on a subclass, or on `Grid` itself to switch
+    every Grid) to render Date, Time and DateTime columns with a single input
+    per cell instead of a set of select boxes. See
+    :class:`~formalchemy.renderers.CompactDateFieldRenderer`.
+
+    Set `shared_options` to True to render the option list of dropdown
+    columns once per Grid instead of once per row: each cell only carries its
+    selected option, and the full list is filled in by the script returned by
+    `render_shared_options`, which the default templates output after the
+    rows. See :class:`~formalchemy.renderers.SharedSelectFieldRenderer`.
+
+    Set `columnar_validation` to True to `validate` column by column: the
+    submitted values of a column are read, deserialized and validated for
+    all the rows at once, when its renderer reads a single input the default
+    way and all its validators have a `batch` version (as the validators of
+    `formalchemy.validators` do). Other columns are validated row by row.
+    Errors are the same either way.
+
+    Set `max_errors` to stop validating once that many cells have errors
+    (1 to fail fast), for clients which only need the first errors of a
+    large submission. `errors` then only holds the rows with errors, so
+    read it with `errors.get(row, {})`. A column validated at once reports
+    the errors of all its rows.
+
+    `export_csv` writes the rows of a query, or of any iterable, to a CSV
+    file, as the plain text of the read-only Grid. `to_dict` and `to_json`
+    return the Grid as data, for clients which render it themselves.
     """
     engine = _render = _render_readonly = None
+    compact_dates = False
+    shared_options = False
+    _shared_options = None
+    columnar_validation = False
+    # results of validators computed for all the rows at once, during
+    # `validate` only (see `validators.unique`)
+    _validation_cache = None
 
     def __init__(self, cls, instances=[], session=None, data=None, prefix=None):
         from sqlalchemy.orm import class_mapper
         if not class_mapper(cls):
             raise Exception('Grid must be bound to an SA mapped class')
         base.EditableRenderer.__init__(self, cls, session, data, prefix) 
+        if self.compact_dates or self.shared_options:
+            default_renderers = dict(self.default_renderers)
+            if self.compact_dates:
+                default_renderers.update(renderers.compact_renderers)
+            if self.shared_options:
+                default_renderers['dropdown'] = renderers.SharedSelectFieldRenderer
+            self.default_renderers = default_renderers
         self.rows = instances
         self.readonly = False
         self.errors = {}
@@ -78,7 +157,7 @@ class Grid(base.EditableRenderer):
             else:
                 from sqlalchemy.orm import object_session
                 session = object_session(instance)
-        mr = base.EditableRenderer.bind(self, self.model, session, data)
+        mr = base.EditableRenderer.bind(self, self._model, session, data)
         mr.rows = instances
         return mr
 
@@ -86,12 +165,14 @@ class Grid(base.EditableRenderer):
         """rebind to instances"""
         if instances is not None:
             _validate_iterable(instances)
-        base.EditableRenderer.rebind(self, self.model, session, data)
+        base.EditableRenderer.rebind(self, self._model, session, data)
         if instances is not None:
             self.rows = instances
 
     def render(self, **kwargs):
         engine = self.engine or config.engine
+        # call options callables again for each render
+        self._reset_options()
         if self._render or self._render_readonly:
             import warnings
             warnings.warn(DeprecationWarning('_render and _render_readonly are deprecated and will be removed in 1.5. Use a TemplateEngine instead'))
@@ -100,11 +181,216 @@ class Grid(base.EditableRenderer):
                 engine._update_args(kwargs)
                 return self._render_readonly(collection=self, **kwargs)
             return engine('grid_readonly', collection=self, **kwargs)
+        if self.shared_options:
+            self._shared_options = OrderedDict()
+            try:
+                html = self._render_editable(engine, kwargs)
+                shared = self._shared_options
+            finally:
+                self._shared_options = None
+            if not shared:
+                return html
+            import warnings
+            warnings.warn('The grid template did not output render_shared_options(): rendering regular select boxes instead')
+        return self._render_editable(engine, kwargs)
+
+    def _render_editable(self, engine, kwargs):
         if self._render is not None:
             engine._update_args(kwargs)
             return self._render(collection=self, **kwargs)
         return engine('grid', collection=self, **kwargs)
 
+    def render_shared_options(self):
+        """
+        Return a script filling the select boxes rendered by
+        `SharedSelectFieldRenderer` with the option list of their column, or
+        an empty string if no such select box has been rendered since the
+        last call.
+
+        The grid template must output it after the rows: when it does not,
+        `render` warns and renders the Grid again, with regular select boxes,
+        so that custom templates written before `shared_options` keep
+        working.
+        """
+        shared = self._shared_options
+        if not shared:
+            return ''
+        columns = []
+        for key, options in shared.iteritems():
+            L = []
+            for o in options:
+                if isinstance(o, (list, tuple)):
+                    label, value = o[0], o[1]
+                else:
+                    label = value = o
+                L.append('[%s,%s]' % (h.js_string(label), h.js_string(value)))
+            columns.append('%s:[%s]' % (h.js_string(key), ','.join(L)))
+        self._shared_options = OrderedDict()
+        return _shared_options_script % ','.join(columns)
+
+    def export_csv(self, rows=None, stream=None, batch_size=1000,
+                   encoding='utf-8', header=True, **fmtparams):
+        """
+        Write `rows` (by default, the rows of the Grid) to `stream` as CSV, one
+        line per row and one column per field of `render_fields`, with the
+        labels in a first line unless `header` is False. Cells are the plain
+        text of the fields, without html (see `FieldRenderer.render_text`).
+        Return the number of rows written.
+
+        `rows` may be a query, which is then iterated `batch_size` rows at a
+        time (see `Query.yield_per`), or any iterable; it is never copied to a
+        list. Lines are written, and `stream` flushed, every `batch_size`
+        rows.
+
+        The objects of the scalar relations of each batch are loaded with one
+        query per relation, run while the cursor of the query is still open,
+        as lazy loads would be. Drivers which cannot run a statement before
+        the rows of another one are fetched (such as those of SQL Server
+        without MARS) need an iterable whose rows are already fetched, like a
+        generator over slices of the query.
+
+        If `stream` is None, return an iterator over these blocks of lines
+        instead, which can be used as a WSGI response body::
+
+            start_response('200 OK', [('Content-Type', 'text/csv')])
+            return grid.export_csv(session.query(User))
+
+        Other keyword arguments are CSV format parameters, as for
+        `csv.writer`; pass `delimiter='\\t'` for TSV.
+        """
+        blocks = self._iter_csv(rows, batch_size, encoding, header, fmtparams)
+        if stream is None:
+            return (block for block, lines in blocks)
+        count = 0
+        for block, lines in blocks:
+            stream.write(block)
+            if hasattr(stream, 'flush'):
+                stream.flush()
+            count += lines
+        return count
+
+    def _iter_csv(self, rows, batch_size, encoding, header, fmtparams):
+        rows, session = self._query_rows(rows, batch_size)
+        fields = self.render_fields.values()
+        buffer = StringIO()
+        writer = csv.writer(buffer, **fmtparams)
+        if header:
+            writer.writerow([_encode(field.label_text or self.prettify(field.key), encoding)
+                             for field in fields])
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) < batch_size:
+                continue
+            yield self._write_csv(writer, buffer, fields, batch, session, encoding), len(batch)
+            batch = []
+        if batch or buffer.tell():
+            yield self._write_csv(writer, buffer, fields, batch, session, encoding), len(batch)
+
+    def _query_rows(self, rows, batch_size):
+        """return `rows` (by default, the rows of the Grid), iterated
+        `batch_size` rows at a time if it is a query, and its session"""
+        if rows is None:
+            rows = self.rows
+        if hasattr(rows, 'yield_per'):
+            return rows.yield_per(batch_size), rows.session
+        return rows, None
+
+    def _write_csv(self, writer, buffer, fields, batch, session, encoding):
+        """write the lines of `batch` and return the content of `buffer`"""
+        # the related objects of the batch stay in the identity map until
+        # the lines are written
+        related = self._load_related(fields, batch, session or self.session)
+        for row in batch:
+            self._set_active(row, session)
+            writer.writerow([_encode(field.render_text(), encoding) for field in fields])
+        block = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return block
+
+    def _load_related(self, fields, rows, session):
+        """
+        Return the objects of the scalar relations of `rows`, loaded with one
+        query per relation instead of one per row
+        """
+        related = []
+        if session is None:
+            return related
+        for field in fields:
+            if not field.is_scalar_relation:
+                continue
+            columns = list(class_mapper(field.relation_type()).primary_key)
+            if len(columns) != 1:
+                continue
+            keys = {}
+            for row in rows:
+                key = getattr(row, field.name, None)
+                if key is not None:
+                    keys[key] = True
+            keys = keys.keys()
+            q = session.query(field.relation_type())
+            # stay below the bound parameters limit of some databases
+            for i in xrange(0, len(keys), 500):
+                related.extend(q.filter(columns[0].in_(keys[i:i + 500])).all())
+        return related
+
+    def to_dict(self, rows=None):
+        """
+        Return the Grid as data rather than HTML: a dict with the columns
+        under `columns` and the rows under `rows`. Each column is the part
+        of the `to_dict()` of its field which is the same for all the rows
+        (`key`, `label`, `type`, `required`, `readonly` and `options`, so
+        option lists are given once per column), and each row is a dict with
+        the primary key of the instance under `pk` and a list of cells under
+        `fields`, with the `name`, `value` and `errors` of each field.
+        """
+        columns = [field._column_dict() for field in self.render_fields.itervalues()]
+        rows, session = self._query_rows(rows, 1000)
+        return {'columns': columns,
+                'rows': [self._row_dict(row, session) for row in rows]}
+
+    def to_json(self, rows=None, stream=None, batch_size=1000, **kwargs):
+        """
+        Encode `to_dict(rows)` as JSON, one row at a time. Queries are
+        iterated `batch_size` rows at a time, and no list of the rows is
+        built, as in `export_csv`. Keyword arguments are given to
+        `json.JSONEncoder`.
+
+        Write the JSON to `stream`, and return the number of rows, or if
+        `stream` is None return an iterator over the parts of the JSON
+        document, which can be used as a WSGI response body.
+        """
+        parts = self._iter_json(rows, batch_size, _json_module().JSONEncoder(**kwargs))
+        if stream is None:
+            return (part for part, count in parts)
+        written = 0
+        for part, count in parts:
+            stream.write(part)
+            written += count
+        return written
+
+    def _iter_json(self, rows, batch_size, encoder):
+        columns = [field._column_dict() for field in self.render_fields.itervalues()]
+        yield '{"columns": %s, "rows": [' % encoder.encode(columns), 0
+        rows, session = self._query_rows(rows, batch_size)
+        separator = ''
+        for row in rows:
+            yield separator + encoder.encode(self._row_dict(row, session)), 1
+            separator = ', '
+        yield ']}', 0
+
+    def _row_dict(self, row, session):
+        self._set_active(row, session)
+        errors = self.errors.get(row, {})
+        cells = []
+        for field in self.render_fields.itervalues():
+            cell = field._cell_dict()
+            # field errors are those of the last row validated
+            cell['errors'] = [stringify(getattr(e, 'message', e)) for e in errors.get(field, [])]
+            cells.append(cell)
+        return {'pk': _json_value(_pk(row)), 'fields': cells}
+
     def _set_active(self, instance, session=None):
         base.EditableRenderer.rebind(self, instance, session or self.session, self.data)
 
@@ -115,15 +401,118 @@ class Grid(base.EditableRenderer):
         if self.readonly:
             raise Exception('Cannot validate a read-only Grid')
         self.errors.clear()
-        success = True
+        self._validation_cache = {}
+        try:
+            if self.columnar_validation:
+                return self._validate_columns()
+            return self._validate_rows()
+        finally:
+            self._validation_cache = None
+
+    def _validate_rows(self):
+        pending = []
+        results = []
+        failed = 0
         for row in self.rows:
+            if self._budget_spent(failed):
+                break
             self._set_active(row)
             row_errors = {}
             for field in self.render_fields.itervalues():
-                success = field._validate() and success
+                if self._budget_spent(failed):
+                    break
+                valid = field._validate(pending)
                 if field.errors:
                     row_errors[field] = field.errors
-            self.errors[row] = row_errors
+                    if fields._failed(field.errors):
+                        failed += 1
+                results.append((row_errors, field, valid))
+            if row_errors or self.max_errors is None:
+                self.errors[row] = row_errors
+        success = self._validate_pending(pending, results)
+        self._drop_valid_rows()
+        return success
+
+    def _budget_spent(self, failed):
+        return self.max_errors is not None and failed >= self.max_errors
+
+    def _drop_valid_rows(self):
+        """with `max_errors`, only keep the rows with errors in `errors`"""
+        if self.max_errors is None:
+            return
+        for row, row_errors in self.errors.items():
+            if not row_errors:
+                del self.errors[row]
+
+    def _validate_pending(self, pending, results):
+        """
+        Run the I/O-bound validators deferred while validating the rows, and
+        return whether the rows are valid, given the `(row errors, field,
+        result of _validate)` triples in `results`
+        """
+        fields._validate_pending(pending, self.io_workers)
+        success = True
+        for row_errors, field, valid in results:
+            if valid:
+                continue
+            if row_errors.get(field):
+                success = False
+            elif field in row_errors:
+                # only I/O-bound validators failed, and they passed
+                del row_errors[field]
+        return success
+
+    def _validate_columns(self):
+        rows = list(self.rows)
+        pks = [_pk(row) for row in rows]
+        row_errors = [{} for row in rows]
+        success = True
+        columns = {}
+        remaining = []
+        failed = 0
+        for field in self.render_fields.itervalues():
+            if self._budget_spent(failed):
+                break
+            column = field._validate_column(rows, pks)
+            if column is None:
+                remaining.append(field)
+                continue
+            columns[field] = column
+            for i, (value, errors) in enumerate(column):
+                if errors:
+                    row_errors[i][field] = errors
+                    success = False
+                    failed += 1
+        # the other fields are validated for the active row, as usual
+        pending = []
+        results = []
+        for i, row in enumerate(rows):
+            if not remaining or self._budget_spent(failed):
+                break
+            self._set_active(row)
+            for field in remaining:
+                if self._budget_spent(failed):
+                    break
+                valid = field._validate(pending)
+                if field.errors:
+                    row_errors[i][field] = field.errors
+                    if fields._failed(field.errors):
+                        failed += 1
+                results.append((row_errors[i], field, valid))
+        success = self._validate_pending(pending, results) and success
+        if rows:
+            # leave the fields as validating row by row does
+            if not remaining:
+                self._set_active(rows[-1])
+            for field, column in columns.iteritems():
+                value, errors = column[-1]
+                field.errors = errors
+                if not (errors and isinstance(errors[0], validators.ValidationError)):
+                    field._deserialization_result = value
+                    field._deserialization_done = True
+        for i, row in enumerate(rows):
+            self.errors[row] = row_errors[i]
+        self._drop_valid_rows()
         return success
 
     def sync_one(self, row):
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+from StringIO import StringIO
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.declarative import declarative_base
+
+from formalchemy.tests import *
+from formalchemy.ext.csvimport import import_csv
+
+CsvBase = declarative_base(create_engine('sqlite://'))
+
+class Country(CsvBase):
+    __tablename__ = 'countries'
+    id = Column(Integer, primary_key=True)
+    name = Column(Unicode(20), nullable=False)
+    def __unicode__(self):
+        return self.name
+
+class City(CsvBase):
+    __tablename__ = 'cities'
+    id = Column(Integer, primary_key=True)
+    name = Column(Unicode(20), nullable=False)
+    population = Column(Integer)
+    founded = Column(Date)
+    country_id = Column(Integer, ForeignKey('countries.id'), nullable=False)
+    country = relation(Country)
+
+CsvBase.metadata.create_all()
+
+def test_import_csv():
+    """
+    >>> csv_session = sessionmaker()()
+    >>> n = csv_session.query(City).delete()
+    >>> n = csv_session.query(Country).delete()
+    >>> csv_session.add_all([Country(id=1, name=u'France'), Country(id=2, name=u'Italy')])
+    >>> csv_session.commit()
+
+    >>> fs = FieldSet(City, session=csv_session)
+    >>> fs.configure(include=[fs.name.validate(validators.maxlength(10)), fs.population, fs.founded, fs.country])
+    >>> stream = StringIO('''Name,population,founded,country_id,unknown
+    ... Paris,2200000,0508-01-01,1,x
+    ... Lyon,,,1
+    ... Roma,lots,,2
+    ... Firenze,370000,,2
+    ... Bordeaux-sur-Gironde,,,1
+    ... Napoli,,,
+    ... ''')
+    >>> rejects = StringIO()
+    >>> import_csv(fs, stream, rejects=rejects, chunk_size=2)
+    (3, 3)
+    >>> print rejects.getvalue().replace('\\r', '')
+    Name,population,founded,country_id,unknown,errors
+    Roma,lots,,2,,population: Value is not an integer
+    Bordeaux-sur-Gironde,,,1,,name: Value must be no more than 10 characters long
+    Napoli,,,,,country: Please enter a value
+    <BLANKLINE>
+
+    Valid rows were committed in chunks, and are not kept in the session:
+
+    >>> len(csv_session.identity_map) <= 2
+    True
+    >>> [(c.name, c.population, c.founded, c.country.name) for c in csv_session.query(City).order_by(City.id)]
+    [(u'Paris', 2200000, datetime.date(508, 1, 1), u'France'), (u'Lyon', None, None, u'France'), (u'Firenze', 370000, None, u'Italy')]
+
+    The FieldSet is left as it was:
+
+    >>> fs.model.name is None, fs.data is None
+    (True, True)
+
+    Columns may also be given; the file then has no header:
+
+    >>> import_csv(fs, StringIO('1;Torino\\n'), columns=['country', 'name'], delimiter=';')
+    (1, 0)
+    >>> csv_session.query(City).filter_by(name=u'Torino').one().country_id
+    1
+    >>> import_csv(fs, StringIO('Torino\\n'), columns=['name'])
+    Traceback (most recent call last):
+    ...
+    ValueError: No column for the required field country
+    """
@@ -2454,8 +2454,105 @@ False
 False
 >>> fs.errors
 {AttributeField(foobar): [ValidationError('Incomplete datetime',)]}
+
+The select boxes are precomputed once per language and html options; only the
+input name and the selected option change from one render to the next:
+
+>>> from formalchemy import renderers
+>>> renderers._select_widgets.clear()
+>>> fs = FieldSet(Dt)
+>>> dt = fs.model
+>>> dt.foo = datetime.date(2008, 6, 3)
+>>> html = fs.foo.render()
+>>> html_fr = fs.foo.with_html(lang='fr').render()
+>>> sorted([key[0] for key in renderers._select_widgets])
+['day', 'day', 'month', 'month']
+>>> html == fs.foo.render()
+True
+>>> print html_fr #doctest: +ELLIPSIS
+<span id="Dt--foo"><select id="Dt--foo__month" lang="fr" name="Dt--foo__month"><option value="MM">Mois</option>
+...
+<option value="6" selected="selected">Juin</option>
+...
+>>> fs.rebind(dt, data={'Dt--foo__day': '4', 'Dt--foo__month': '6', 'Dt--foo__year': '2008'})
+>>> html = fs.foo.render()
+>>> '<option value="3" selected="selected">3</option>' in html
+False
+>>> '<option value="4" selected="selected">4</option>' in html
+True
+>>> len(renderers._select_widgets)
+4
 """
 
+def test_compact_renderers():
+    """
+    Grids can render dates with a single input per cell:
+
+    >>> class CompactGrid(Grid):
+    ...     compact_dates = True
+    >>> dt = Dt(id=1, foo=datetime.date(2008, 6, 3), bar=datetime.time(14, 16, 18),
+    ...         foobar=datetime.datetime(2008, 6, 3, 14, 16, 18))
+    >>> session.expunge(dt)
+    >>> g = CompactGrid(Dt, [dt])
+    >>> g.configure(include=[g.foo, g.bar, g.foobar])
+    >>> print g.render()
+    <thead>
+     <tr>
+      <th>
+       Foo
+      </th>
+      <th>
+       Bar
+      </th>
+      <th>
+       Foobar
+      </th>
+     </tr>
+    </thead>
+    <tbody>
+     <tr class="even">
+      <td>
+       <input id="Dt-1-foo" name="Dt-1-foo" type="date" value="2008-06-03" />
+      </td>
+      <td>
+       <input id="Dt-1-bar" name="Dt-1-bar" type="time" value="14:16:18" />
+      </td>
+      <td>
+       <input id="Dt-1-foobar" name="Dt-1-foobar" type="datetime-local" value="2008-06-03T14:16:18" />
+      </td>
+     </tr>
+    </tbody>
+
+    Other grids are not affected:
+
+    >>> Grid(Dt).foo.renderer
+    <DateFieldRenderer for AttributeField(foo)>
+
+    Submitted values are validated like the ones of the default renderers:
+
+    >>> g.rebind(data={'Dt-1-foo': '2009-02-30', 'Dt-1-bar': '10:30', 'Dt-1-foobar': '2009-01-02'})
+    >>> g.validate()
+    False
+    >>> sorted([(field.key, errors) for field, errors in g.errors[dt].items()])
+    [('foo', [ValidationError('Invalid date',)]), ('foobar', [ValidationError('Incomplete datetime',)])]
+    >>> g.rebind(data={'Dt-1-foo': '2009-01-30', 'Dt-1-bar': '10:30', 'Dt-1-foobar': '2009-01-02T08:15'})
+    >>> g.validate()
+    True
+    >>> g.sync()
+    >>> dt.foo, dt.bar, dt.foobar
+    (datetime.date(2009, 1, 30), datetime.time(10, 30), datetime.datetime(2009, 1, 2, 8, 15))
+
+    Empty values are None:
+
+    >>> g.rebind(data={'Dt-1-foo': '', 'Dt-1-bar': '', 'Dt-1-foobar': ''})
+    >>> g.validate()
+    True
+    >>> g.sync()
+    >>> dt.foo, dt.bar, dt.foobar
+    (None, None, None)
+    >>> session.expunge(dt)
+    """
+
 if __name__ == '__main__':
     import doctest
     doctest.testmod()
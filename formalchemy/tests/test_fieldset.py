@@ -651,6 +651,16 @@ False
  <input id="Three--bar" name="Three--bar" type="text" value="fdsa" />
 </div>
 
+# max_errors: stop at the first error, and skip the global validator
+>>> fs_3 = FieldSet(Three, data={'Three--foo': '', 'Three--bar': ''})
+>>> fs_3.configure(include=[fs_3.foo.required(), fs_3.bar.required()], global_validator=custom_validator)
+>>> fs_3.max_errors = 1
+>>> fs_3.validate(), fs_3.errors
+(False, {AttributeField(foo): ['Please enter a value']})
+>>> fs_3.rebind(data={'Three--foo': 'asdf', 'Three--bar': 'fdsa'})
+>>> fs_3.validate(), sorted(fs_3.errors.items())
+(False, [(None, ('foo and bar do not match',)), (AttributeField(foo), ['does not match bar'])])
+
 # custom renderer
 >>> fs_3 = FieldSet(Three, data={'Three--foo': 'http://example.com/image.png'})
 >>> fs_3.configure(include=[fs_3.foo.with_renderer(ImgRenderer)])
@@ -1007,13 +1017,22 @@ True
 ['order_user', 'tag']
 >>> print pretty_html(out.order_user.render())
 <select id="OrderUserTag--order_user" name="OrderUserTag--order_user">
- <option value="(1, 1)">
+ <option value="i1|i1">
   OrderUser(1, 1)
  </option>
- <option value="(1, 2)">
+ <option value="i1|i2">
   OrderUser(1, 2)
  </option>
 </select>
+>>> out.rebind(data={'OrderUserTag--order_user': 'i1|i1', 'OrderUserTag--tag': 'asdf'})
+>>> out.validate()
+True
+>>> out.sync()
+>>> print out.model.order_user
+OrderUser(1, 1)
+
+Keys posted in the former repr form are still understood:
+
 >>> out.rebind(data={'OrderUserTag--order_user': '(1, 2)', 'OrderUserTag--tag': 'asdf'})
 >>> out.validate()
 True
@@ -115,3 +115,33 @@ def field_set():
     'new_passwd'
     """
 
+
+def to_dict():
+    """
+    >>> fs = FieldSet(Order)
+    >>> fs.configure(include=[fs.quantity, fs.user.label('Customer')])
+    >>> for field in fs.to_dict()['fields']:
+    ...     print sorted(field.items())
+    [('errors', []), ('key', 'quantity'), ('label', 'Quantity'), ('name', u'Order--quantity'), ('options', None), ('readonly', False), ('required', True), ('type', 'Integer'), ('value', None)]
+    [('errors', []), ('key', 'user'), ('label', 'Customer'), ('name', u'Order--user_id'), ('options', [[u'Bill', 1], [u'John', 2]]), ('readonly', False), ('required', True), ('type', 'Integer'), ('value', None)]
+
+    Invalid submitted values are returned as submitted, with their errors:
+
+    >>> fs.rebind(data={'Order--quantity': 'ten', 'Order--user_id': '2'})
+    >>> fs.validate()
+    False
+    >>> print fs.to_json(sort_keys=True)
+    {"errors": [], "fields": [{"errors": ["Value is not an integer"], "key": "quantity", "label": "Quantity", "name": "Order--quantity", "options": null, "readonly": false, "required": true, "type": "Integer", "value": "ten"}, {"errors": [], "key": "user", "label": "Customer", "name": "Order--user_id", "options": [["Bill", 1], ["John", 2]], "readonly": false, "required": true, "type": "Integer", "value": 2}]}
+
+    Masked values, such as passwords, are not given:
+
+    >>> fs = FieldSet(User)
+    >>> fs.configure(include=[fs.name, fs.password.password()])
+    >>> fs.rebind(session.query(User).get(1))
+    >>> [(field['key'], field['value']) for field in fs.to_dict()['fields']]
+    [('name', u'Bill'), ('password', None)]
+    >>> g = Grid(User, session.query(User).filter_by(id=1))
+    >>> g.configure(include=[g.password.password()], readonly=True)
+    >>> [[cell['value'] for cell in row['fields']] for row in g.to_dict()['rows']]
+    [[None]]
+    """
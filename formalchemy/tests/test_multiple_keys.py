@@ -99,3 +99,46 @@ def test_deserialize_new_record():
     session.rollback()
 
 
+
+def test_pk_attribute_name():
+    """
+    Primary keys are read from the mapped attribute, even when it is not named
+    after the column::
+
+        >>> from formalchemy.utils import _pk
+        >>> class Ugly(declarative_base()):
+        ...     __tablename__ = 'ugly'
+        ...     id = Column('UGLY_ID', Integer, primary_key=True)
+        ...     id2 = Column('UGLY_ID2', String(10), primary_key=True)
+        >>> _pk(Ugly(id=1, id2='a'))
+        (1, 'a')
+        >>> print _pk(Ugly())
+        (None, None)
+        >>> print _pk(1)
+        None
+    """
+
+def test_pk_codec():
+    """
+    Composite keys survive a round trip through their string form::
+
+        >>> from formalchemy.utils import encode_pk, decode_pk
+        >>> keys = [(1, u'22'), (-3L, u'a\\\\b|c'), (True, None, 2.5), (u'',)]
+        >>> [decode_pk(encode_pk(k)) for k in keys] == keys
+        True
+        >>> decode_pk(encode_pk((1, u'22'))) is decode_pk(encode_pk((1, u'22')))
+        True
+
+    Values which can not be tagged keep their repr form::
+
+        >>> import datetime
+        >>> encode_pk((1, datetime.date(2009, 1, 1)))
+        u'(1, datetime.date(2009, 1, 1))'
+
+    Invalid keys are rejected::
+
+        >>> decode_pk(u'x1|i2')
+        Traceback (most recent call last):
+        ...
+        ValueError: invalid primary key item u'x1'
+    """
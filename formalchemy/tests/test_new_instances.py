@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+from formalchemy.tests import *
+
+created = []
+
+class Ticket(Base):
+    __tablename__ = 'tickets'
+    id = Column(Integer, primary_key=True)
+    status = Column(Unicode(10), default=u'open')
+    user_id = Column(Integer, ForeignKey('users.id'))
+    user = relation(User)
+    def __init__(self, **kwargs):
+        created.append(self)
+
+def test_new_instance():
+    """
+    Binding a mapped class does not create the new instance; fields read a
+    placeholder, which answers mapped attributes as a new instance would:
+
+    >>> del created[:]
+    >>> fs = FieldSet(Ticket)
+    >>> fs.configure(include=[fs.status, fs.user])
+    >>> fs.session is session
+    True
+    >>> fs.status.value
+    u'open'
+    >>> fs.user.value
+    >>> html = fs.render()
+    >>> created
+    []
+
+Nor does binding or rendering a dropdown with callable options:
+
+    >>> def statuses(fs):
+    ...     return [(u'Open', u'open'), (u'Closed', u'closed')]
+    >>> fs2 = FieldSet(Ticket)
+    >>> fs2.configure(include=[fs2.status.dropdown(options=statuses)])
+    >>> fs2 = fs2.bind(Ticket)
+    >>> html = fs2.render()
+    >>> print fs2.status.render_readonly()
+    Open
+    >>> created
+    []
+
+    The instance is created by `sync`, or when `model` is read:
+
+    >>> fs.rebind(data={'Ticket--status': u'closed', 'Ticket--user_id': '1'})
+    >>> fs.validate()
+    True
+    >>> fs.sync()
+    >>> created == [fs.model]
+    True
+    >>> fs.model.status, fs.model.user_id
+    (u'closed', 1)
+    >>> fs.model in session
+    True
+    >>> session.expunge(fs.model)
+
+    >>> FieldSet(Ticket).model.status
+    >>> len(created)
+    2
+    """
@@ -31,3 +31,222 @@ def test_lazy_filtered_dropdown():
      </option>
     </select>
     """
+
+def test_callable_options_per_request():
+    """
+    The options callable is called again when the FieldSet is rendered or
+    rebound again, so each request gets its own labels:
+
+    >>> labels = {10: u'ten'}
+    >>> def quantities(fs_):
+    ...     return [(labels[10], 10), (u'five', 5)]
+    >>> fs = FieldSet(Order)
+    >>> fs.configure(include=[fs.quantity.dropdown(options=quantities)], readonly=True)
+    >>> order1 = session.query(Order).get(1)
+    >>> fs.rebind(order1)
+    >>> print fs.quantity.render_readonly()
+    ten
+    >>> labels[10] = u'dix'
+    >>> fs.rebind(order1)
+    >>> print fs.quantity.render_readonly()
+    dix
+    >>> labels[10] = u'zehn'
+    >>> 'zehn' in fs.render()
+    True
+    """
+
+def test_option_list_cache():
+    """
+    Option lists with the same content are escaped once and shared:
+
+    >>> from formalchemy import helpers as h
+    >>> options = h.option_list([('<One>', '1'), ('Two', '2')])
+    >>> options is h.option_list([['<One>', '1'], ['Two', '2']])
+    True
+
+    The type of the values is part of the key, because `1` and `True` do not
+    render the same way:
+
+    >>> h.option_list([('Yes', True)]) is h.option_list([('Yes', 1)])
+    False
+
+    Only the selected markers change from one render to the next:
+
+    >>> print options.render()
+    <option value="1">&lt;One&gt;</option>
+    <option value="2">Two</option>
+    >>> print options.render(['2', '1'])
+    <option value="1" selected="selected">&lt;One&gt;</option>
+    <option value="2" selected="selected">Two</option>
+
+    Unhashable values still work, they just bypass the cache:
+
+    >>> print h.options_for_select([('a', [1]), ('b', [2])], selected=[[2]])
+    <option value="[1]">a</option>
+    <option value="[2]" selected="selected">b</option>
+    """
+
+def test_keys_only():
+    """
+    With `keys_only`, the selected options of a collection come from a query
+    on the primary keys of its members, without loading the collection:
+
+    >>> u = session.query(User).get(2)
+    >>> session.expire(u, ['orders'])
+    >>> fs = FieldSet(u)
+    >>> fs.configure(include=[fs.orders.keys_only(label=Order.quantity)])
+    >>> 'orders' in u.__dict__
+    False
+    >>> fs.orders.model_value
+    [2, 3]
+    >>> print pretty_html(fs.orders.render()) #doctest: +ELLIPSIS
+    <select id="User-2-orders" multiple="multiple" name="User-2-orders" size="5">
+     <option value="2" selected="selected">
+      Quantity: 5
+     </option>
+     <option value="3" selected="selected">
+      Quantity: 6
+     </option>
+     <option value="1">
+      Quantity: 10
+     </option>
+    </select>
+    >>> fs.orders.render_readonly()
+    u'5, 6'
+    >>> 'orders' in u.__dict__
+    False
+
+    A loaded collection is used as is, since it may have been modified:
+
+    >>> len(u.orders)
+    2
+    >>> fs.orders.model_value
+    [2, 3]
+    >>> fs.orders.render_readonly()
+    u'Quantity: 5, Quantity: 6'
+
+    Only collections can be read this way:
+
+    >>> fs.name.keys_only()
+    Traceback (most recent call last):
+    ...
+    ValueError: keys_only() only applies to collections, not AttributeField(name)
+    """
+
+def test_collection_sync():
+    """
+    Collections of persistent objects are synced as a delta: the collection
+    is loaded, and only the added members are queried:
+
+    >>> from sqlalchemy.ext.declarative import declarative_base
+    >>> M2MBase = declarative_base(engine)
+    >>> memberships = Table('memberships', M2MBase.metadata,
+    ...     Column('member_id', Integer, ForeignKey('members.id'), primary_key=True),
+    ...     Column('club_id', Integer, ForeignKey('clubs.id'), primary_key=True))
+    >>> class Club(M2MBase):
+    ...     __tablename__ = 'clubs'
+    ...     id = Column(Integer, primary_key=True)
+    ...     name = Column(String(20))
+    >>> class Member(M2MBase):
+    ...     __tablename__ = 'members'
+    ...     id = Column(Integer, primary_key=True)
+    ...     clubs = relation(Club, secondary=memberships, order_by=Club.id, backref='members')
+    >>> M2MBase.metadata.create_all()
+    >>> clubs = [Club(name='club %d' % i) for i in range(5)]
+    >>> member = Member(clubs=clubs[:3])
+    >>> session.add(member)
+    >>> session.add_all(clubs)
+    >>> session.flush()
+    >>> def rows():
+    ...     return [tuple(row) for row in session.execute(memberships.select().order_by(memberships.c.club_id))]
+
+    >>> fs = FieldSet(member, data={'Member-1-clubs': ['1', '3', '4']})
+    >>> fs.configure(include=[fs.clubs])
+    >>> fs.validate()
+    True
+    >>> fs.sync()
+    >>> 'clubs' in member.__dict__
+    True
+    >>> [club.id for club in member.clubs]
+    [1, 3, 4]
+    >>> session.flush()
+    >>> rows()
+    [(1, 1), (1, 3), (1, 4)]
+
+    With `keys_only`, rows of a plain association table are inserted and
+    deleted directly, and the collection is not loaded. The other side of
+    the relation is expired for the related objects which are loaded:
+
+    >>> session.expire(member, ['clubs'])
+    >>> club2 = session.query(Club).get(2)
+    >>> club2.members
+    []
+    >>> fs = FieldSet(member, data={'Member-1-clubs': ['2', '4']})
+    >>> fs.configure(include=[fs.clubs.keys_only()])
+    >>> fs.sync()
+    >>> 'clubs' in member.__dict__
+    False
+    >>> rows()
+    [(1, 2), (1, 4)]
+    >>> [club.id for club in member.clubs]
+    [2, 4]
+    >>> club2.members == [member]
+    True
+
+    >>> session.rollback()
+    """
+
+def test_dynamic_relation():
+    """
+    Dynamic relations are not rendered by default, but can be included, one
+    page of members at a time:
+
+    >>> u = session.query(User).get(2)
+    >>> fs = FieldSet(u)
+    >>> 'orders_dl' in fs.render_fields
+    False
+    >>> fs.orders_dl.is_dynamic, fs.orders_dl.is_collection
+    (True, True)
+    >>> fs.configure(include=[fs.orders_dl.paginate(items_per_page=1)])
+    >>> fs.orders_dl.model_value
+    [2]
+    >>> fs.configure(include=[fs.orders_dl.paginate(page=2, items_per_page=1)])
+    >>> fs.orders_dl.model_value
+    [3]
+    >>> print pretty_html(fs.orders_dl.render())
+    <select id="User-2-orders_dl" multiple="multiple" name="User-2-orders_dl" size="5">
+     <option value="3" selected="selected">
+      Quantity: 6
+     </option>
+    </select>
+    <input name="User-2-orders_dl-page" type="hidden" value="3" />
+    >>> fs.orders_dl.render_readonly()
+    u'Quantity: 6'
+    >>> fs.orders_dl.reset()
+    AttributeField(orders_dl)
+
+    Only the members of the rendered page, whose keys are submitted with
+    the page, are removed when they are not submitted, even if the page has
+    changed since; members of other pages are left alone:
+
+    >>> fs = FieldSet(u, data={'User-2-orders_dl': ['1', '2']})
+    >>> fs.configure(include=[fs.orders_dl.paginate(items_per_page=1)])
+    >>> fs.validate()
+    True
+    >>> fs.sync()
+    >>> session.flush()
+    >>> [order.id for order in u.orders_dl]
+    [1, 2, 3]
+    >>> fs.rebind(u, data={'User-2-orders_dl': ['1'], 'User-2-orders_dl-page': ['3']})
+    >>> fs.sync()
+    >>> from sqlalchemy.orm.attributes import get_history, instance_state
+    >>> added, unchanged, deleted = get_history(instance_state(u), 'orders_dl')
+    >>> [order.id for order in deleted]
+    [3]
+
+    >>> session.rollback()
+    >>> fs.name.paginate()
+    Traceback (most recent call last):
+    ...
+    ValueError: paginate() only applies to dynamic relations, not AttributeField(name)
+    """
@@ -70,6 +70,41 @@ After rebind:
   >>> fs2.sync()
   >>> assert fs2.passwd1.value == 'other', "Rebind didn't clear cache"
 
+Default renderers are looked up along the MRO of the field type, so the most
+specific entry wins, and changes to `default_renderers` are picked up:
+
+  >>> from formalchemy import fatypes
+  >>> class Code(fatypes.String): pass
+  >>> class CodeFieldSet(FieldSet):
+  ...     default_renderers = dict(FieldSet.default_renderers)
+  >>> fs3 = CodeFieldSet(One).append(Field('code', type=Code))
+  >>> fs3.code.renderer
+  <TextFieldRenderer for AttributeField(code)>
+  >>> CodeFieldSet.default_renderers[Code] = TextAreaFieldRenderer
+  >>> fs3 = CodeFieldSet(One).append(Field('code', type=Code))
+  >>> fs3.code.renderer
+  <TextAreaFieldRenderer for AttributeField(code)>
+
+Renderers memoise the input name and value of the bound row while the field
+is rendered:
+
+  >>> r = fs2.name.renderer
+  >>> r.name is r.name, r._value
+  (True, 'blah')
+  >>> fs2.rebind(bill, data={'User-1-name': 'Bill2'})
+  >>> r.name, r._value
+  (u'User-1-name', 'Bill2')
+  >>> fs2.rebind(bill)
+  >>> r._value
+  u'Bill'
+  >>> fs2.rebind(john)
+  >>> r.name, r._value
+  (u'User-2-name', u'John')
+  >>> john.name = u'Changed'
+  >>> print fs2.name.render()
+  <input id="User-2-name" maxlength="30" name="User-2-name" type="text" value="Changed" />
+  >>> john.name = u'John'
+
 # Test set/get in the Field and the Renderer.
 #   - Show set() modifies IN-PLACE
 
@@ -199,6 +199,206 @@ True
 >>> g.sync()
 >>> bill.email
 'updatebill_@example.com'
+
+With `shared_options`, dropdown cells only carry their selected option, and
+the option list of the column is output once, after the rows:
+
+>>> class SharedGrid(DefaultGrid):
+...     shared_options = True
+>>> g = SharedGrid(Order, session.query(Order).all())
+>>> g.configure(include=[g.user])
+>>> html = g.render()
+>>> html.count('<option')
+3
+>>> print pretty_html(html[:html.index('<script')]) #doctest: +ELLIPSIS
+<thead>
+...
+ <tr class="odd">
+  <td>
+   <select data-options="Order-user_id" id="Order-2-user_id" name="Order-2-user_id">
+    <option value="2" selected="selected">
+     John_
+    </option>
+   </select>
+  </td>
+ </tr>
+...
+>>> 'var O = {"Order-user_id":[["Bill_","1"],["John_","2"]]};' in html
+True
+>>> g.render_shared_options()
+''
+
+A custom grid template which does not output `render_shared_options()` gets
+regular select boxes, with a warning:
+
+>>> import os, shutil, tempfile, warnings
+>>> from formalchemy import templates
+>>> directory = tempfile.mkdtemp()
+>>> template = open(os.path.join(os.path.dirname(templates.__file__), 'grid.tmpl')).read()
+>>> open(os.path.join(directory, 'grid.tmpl'), 'w').write(template.replace('{{collection.render_shared_options()}}', ''))
+>>> g.engine = templates.TempitaEngine(directories=[directory])
+>>> def showwarning(message, category, filename, lineno, file=None, line=None):
+...     print message
+>>> showwarning, warnings.showwarning = warnings.showwarning, showwarning
+>>> html = g.render()
+The grid template did not output render_shared_options(): rendering regular select boxes instead
+>>> warnings.showwarning = showwarning
+>>> shutil.rmtree(directory)
+>>> html.count('<option'), 'data-options' in html
+(6, False)
+
+Submitted data is handled as with regular select boxes:
+
+>>> g.rebind(data={'Order-1-user_id': '2', 'Order-2-user_id': '2', 'Order-3-user_id': '1'})
+>>> g.validate()
+True
+>>> for row in g.to_dict()['rows']:
+...     print row['fields'][0]['value'],
+2 2 1
+
+In read-only grids, the value to label index of dropdowns is built once per
+render, not once per row:
+
+>>> calls = []
+>>> def quantities(grid):
+...     calls.append(grid)
+...     return [('ten', 10), ('five', 5), ('six', 6)]
+>>> g = DefaultGrid(Order, session.query(Order).all())
+>>> g.configure(include=[g.quantity.dropdown(options=quantities)], readonly=True)
+>>> html = g.render()
+>>> 'ten' in html, 'five' in html, 'six' in html
+(True, True, True)
+>>> len(calls)
+1
+>>> html = g.render()
+>>> len(calls)
+2
+
+With `columnar_validation`, columns are validated for all the rows at once,
+with the same results; columns which cannot be (here, a collection) are
+validated row by row:
+
+>>> class ColumnarGrid(DefaultGrid):
+...     columnar_validation = True
+>>> data = {'Order-1-quantity': 'ten', 'Order-2-quantity': '', 'Order-3-quantity': '6',
+...         'Order-1-user_id': '1', 'Order-2-user_id': '2', 'Order-3-user_id': ''}
+>>> orders = session.query(Order).order_by(Order.id).all()
+>>> for cls in DefaultGrid, ColumnarGrid:
+...     g = cls(Order, orders, data=data)
+...     g.configure(include=[g.quantity, g.user])
+...     print g.validate(), [sorted(g.errors[order].items()) for order in orders]
+False [[(AttributeField(quantity), [ValidationError('Value is not an integer',)])], [(AttributeField(quantity), ['Please enter a value'])], [(AttributeField(user), ['Please enter a value'])]]
+False [[(AttributeField(quantity), [ValidationError('Value is not an integer',)])], [(AttributeField(quantity), ['Please enter a value'])], [(AttributeField(user), ['Please enter a value'])]]
+>>> g.quantity._validate_column(orders)
+[(None, [ValidationError('Value is not an integer',)]), (None, ['Please enter a value']), (6, [])]
+
+>>> g = ColumnarGrid(User, [bill, john], data={'User-1-email': '', 'User-1-password': '1234_', 'User-1-name': 'Bill_', 'User-1-orders': '1', 'User-2-email': 'john_@example.com', 'User-2-password': '5678_', 'User-2-name': 'John_', 'User-2-orders': ['2', '3']})
+>>> g.validate()
+False
+>>> g.errors[bill], g.errors[john]
+({AttributeField(email): ['Please enter a value']}, {})
+>>> g.orders._validate_column([bill, john]) is None
+True
+
+The `unique` validator checks the submitted values of all the rows with one
+query; rows submitted the same value conflict, but a row may take the value
+of another row which is changed:
+
+>>> from formalchemy.validators import unique
+>>> calls = []
+>>> order_session = object_session(orders[0])
+>>> def query(*args):
+...     calls.append(args)
+...     return order_session.__class__.query(order_session, *args)
+>>> order_session.query = query
+>>> for cls in DefaultGrid, ColumnarGrid:
+...     g = cls(Order, orders)
+...     g.configure(include=[g.quantity.validate(unique(scope=['user_id']))])
+...     for data in ({'Order-1-quantity': '5', 'Order-2-quantity': '6', 'Order-3-quantity': '6'},
+...                  {'Order-1-quantity': '5', 'Order-2-quantity': '6', 'Order-3-quantity': '5'}):
+...         g.rebind(data=data)
+...         del calls[:]
+...         print g.validate(), [g.errors[order] for order in orders], len(calls)
+False [{}, {AttributeField(quantity): ['Value already exists']}, {AttributeField(quantity): ['Value already exists']}] 1
+True [{}, {}, {}] 1
+False [{}, {AttributeField(quantity): ['Value already exists']}, {AttributeField(quantity): ['Value already exists']}] 1
+True [{}, {}, {}] 1
+
+The scope values are the submitted ones, when the scope is a column:
+
+>>> for cls in DefaultGrid, ColumnarGrid:
+...     g = cls(Order, orders, data={'Order-1-quantity': '10', 'Order-2-quantity': '5', 'Order-3-quantity': '10',
+...                                  'Order-1-user_id': '1', 'Order-2-user_id': '2', 'Order-3-user_id': '1'})
+...     g.configure(include=[g.quantity.validate(unique(scope=['user_id'])), g.user])
+...     print g.validate(), [g.errors[order] for order in orders], g._validation_cache
+False [{AttributeField(quantity): ['Value already exists']}, {}, {AttributeField(quantity): ['Value already exists']}] None
+False [{AttributeField(quantity): ['Value already exists']}, {}, {AttributeField(quantity): ['Value already exists']}] None
+>>> del order_session.query
+
+With `max_errors`, validation stops once that many cells have errors, and
+`errors` only holds the rows with errors:
+
+>>> data = {'Order-1-quantity': 'ten', 'Order-2-quantity': '', 'Order-3-quantity': '6',
+...         'Order-1-user_id': '1', 'Order-2-user_id': '2', 'Order-3-user_id': ''}
+>>> for cls in DefaultGrid, ColumnarGrid:
+...     for max_errors in 1, 2, 10:
+...         g = cls(Order, orders, data=data)
+...         g.configure(include=[g.user, g.quantity])
+...         g.max_errors = max_errors
+...         print g.validate(), sorted([(o.id, sorted([f.key for f in e])) for o, e in g.errors.items()])
+False [(1, ['quantity'])]
+False [(1, ['quantity']), (2, ['quantity'])]
+False [(1, ['quantity']), (2, ['quantity']), (3, ['user'])]
+False [(3, ['user'])]
+False [(1, ['quantity']), (2, ['quantity']), (3, ['user'])]
+False [(1, ['quantity']), (2, ['quantity']), (3, ['user'])]
+
+`export_csv` writes the plain text of the read-only cells, batch by batch,
+without the markup of renderers such as links:
+
+>>> from StringIO import StringIO
+>>> class LinkRenderer(FieldRenderer):
+...     def render_readonly(self, **kwargs):
+...         return '<a href="/orders/%s">%s</a>' % (self.field.model.id, self.field.raw_value)
+>>> fs = FieldSet(session.query(Order).get(1))
+>>> print fs.quantity.with_renderer(LinkRenderer).render_readonly()
+<a href="/orders/1">10</a>
+>>> g = DefaultGrid(Order)
+>>> g.add(Field('ref', value=lambda order: u'<%d>' % order.id).with_renderer(EscapingReadonlyRenderer))
+>>> g.configure(include=[g.quantity.label('Qty').with_renderer(LinkRenderer), g.user, g.ref])
+>>> stream = StringIO()
+>>> g.export_csv(session.query(Order).order_by(Order.id), stream, batch_size=2)
+3
+>>> print stream.getvalue().replace('\r', '')
+Qty,User,Ref
+10,Bill_,<1>
+5,John_,<2>
+6,John_,<3>
+<BLANKLINE>
+
+Without a stream, it returns an iterator over the blocks of lines, to be used
+as a WSGI response body:
+
+>>> list(g.export_csv(session.query(Order).order_by(Order.id), header=False, batch_size=2, delimiter='\t'))
+['10\tBill_\t<1>\r\n5\tJohn_\t<2>\r\n', '6\tJohn_\t<3>\r\n']
+
+`to_json` encodes the rows one by one; options are given once per column:
+
+>>> g = DefaultGrid(Order, [session.query(Order).get(1)], data={'Order-1-quantity': 'ten', 'Order-1-user_id': '2'})
+>>> g.configure(include=[g.quantity, g.user])
+>>> g.validate()
+False
+>>> parts = g.to_json(sort_keys=True)
+>>> print '\n'.join(parts)
+{"columns": [{"key": "quantity", "label": "Quantity", "options": null, "readonly": false, "required": true, "type": "Integer"}, {"key": "user", "label": "User", "options": [["Bill_", 1], ["John_", 2]], "readonly": false, "required": true, "type": "Integer"}], "rows": [
+{"fields": [{"errors": ["Value is not an integer"], "name": "Order-1-quantity", "value": "ten"}, {"errors": [], "name": "Order-1-user_id", "value": 2}], "pk": 1}
+]}
+>>> g.rebind(data=None)
+>>> stream = StringIO()
+>>> g.to_json(session.query(Order), stream, batch_size=2)
+3
+>>> [row['fields'][0]['value'] for row in g.to_dict(session.query(Order).order_by(Order.id))['rows']]
+[10, 5, 6]
 """
 
 if __name__ == '__main__':
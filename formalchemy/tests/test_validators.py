@@ -32,8 +32,268 @@ passwords_match:
   >>> fs.errors
   {}
 
+validate_records validates plain dicts keyed by field name, without binding
+them; values which are not strings are parsed as if they had been submitted:
+
+  >>> fs = FieldSet(User)
+  >>> fs.configure(include=[fs.email.validate(email), fs.name.validate(maxlength(5)), fs.orders])
+  >>> records = [{'email': u'bob@example.com', 'name': u'Bob', 'orders': ['1', 3]},
+  ...            {'email': u'bob', 'name': u'Roberto', 'orders': '2'},
+  ...            {'email': 5}]
+  >>> for values, errors in fs.validate_records(records, chunk_size=2):
+  ...     print sorted(values.items()), sorted(errors.items())
+  [('email', u'bob@example.com'), ('name', u'Bob'), ('orders', [1, 3])] []
+  [('orders', [2])] [('email', ['Invalid e-mail address']), ('name', ['Value must be no more than 5 characters long'])]
+  [('name', None), ('orders', [])] [('email', ['Invalid e-mail address'])]
+
+  >>> fs = FieldSet(Order)
+  >>> fs.configure(include=[fs.quantity, fs.user])
+  >>> for values, errors in fs.validate_records([{'quantity': 4.5, 'user': 1}, {'quantity': '7', 'user': ''}]):
+  ...     print sorted(values.items()), sorted(errors.items())
+  [('user', 1)] [('quantity', ['Value is not an integer'])]
+  [('quantity', 7)] [('user', ['Please enter a value'])]
+
+Fields whose renderer overrides `deserialize`, or which have validators
+without a `batch` version, are validated with each record bound, as
+submitted data:
+
+  >>> class UpperRenderer(TextFieldRenderer):
+  ...     def deserialize(self):
+  ...         return TextFieldRenderer.deserialize(self).upper()
+  >>> def not_in_email(value, field):
+  ...     if value.lower() in field.parent.email.value:
+  ...         raise ValidationError('Name must not be in the e-mail address')
+  >>> fs = FieldSet(User)
+  >>> fs.configure(include=[fs.email, fs.name.with_renderer(UpperRenderer).validate(not_in_email)])
+  >>> records = [{'email': u'bob@example.com', 'name': u'Bob'}, {'email': u'bill@example.com', 'name': u'Bob'}]
+  >>> for values, errors in fs.validate_records(records):
+  ...     print sorted(values.items()), sorted(errors.items())
+  [('email', u'bob@example.com')] [('name', ['Name must not be in the e-mail address'])]
+  [('email', u'bill@example.com'), ('name', u'BOB')] []
+
+unique looks the value up, and does not count the bound model itself:
+
+  >>> fs = FieldSet(Order)
+  >>> fs.configure(include=[fs.quantity.validate(unique())])
+  >>> fs.rebind(Order, data={'Order--quantity': '6'})
+  >>> fs.validate(), fs.errors
+  (False, {AttributeField(quantity): ['Value already exists']})
+  >>> order3 = session.query(Order).get(3)
+  >>> fs.rebind(order3, data={'Order-3-quantity': '6'})
+  >>> fs.validate()
+  True
+
+With a `scope`, only the objects with the same values of these attributes
+conflict (order 1 belongs to another user):
+
+  >>> fs = FieldSet(Order)
+  >>> fs.configure(include=[fs.quantity.validate(unique(scope=['user_id']))])
+  >>> fs.rebind(order3, data={'Order-3-quantity': '10'})
+  >>> fs.validate()
+  True
+  >>> fs.rebind(order3, data={'Order-3-quantity': '5'})
+  >>> fs.validate()
+  False
+
+The scope values are the submitted ones when the scope is a field of the
+form, for new objects too:
+
+  >>> fs = FieldSet(Order)
+  >>> fs.configure(include=[fs.quantity.validate(unique(scope=['user_id'])), fs.user])
+  >>> fs.rebind(Order, data={'Order--quantity': '5', 'Order--user_id': '2'})
+  >>> fs.validate(), fs.errors
+  (False, {AttributeField(quantity): ['Value already exists']})
+  >>> fs.rebind(order3, data={'Order-3-quantity': '10', 'Order-3-user_id': '1'})
+  >>> fs.validate(), fs.errors
+  (False, {AttributeField(quantity): ['Value already exists']})
+  >>> fs.rebind(Order, data={'Order--quantity': '5', 'Order--user_id': '1'})
+  >>> fs.validate()
+  True
+
+validate_records checks all the records with one query, and records with the
+same value conflict:
+
+  >>> fs = FieldSet(Order)
+  >>> fs.configure(include=[fs.quantity.validate(unique())])
+  >>> for values, errors in fs.validate_records([{'quantity': 5}, {'quantity': 7}, {'quantity': 8}, {'quantity': 8}]):
+  ...     print values, errors
+  {} {'quantity': ['Value already exists']}
+  {'quantity': 7} {}
+  {} {'quantity': ['Value already exists']}
+  {} {'quantity': ['Value already exists']}
+
+and take the scope values from the records:
+
+  >>> fs = FieldSet(Order)
+  >>> fs.configure(include=[fs.quantity.validate(unique(scope=['user_id'])), fs.user])
+  >>> for values, errors in fs.validate_records([{'quantity': 10, 'user': 2}, {'quantity': 10, 'user': 1},
+  ...                                            {'quantity': 7, 'user': 1}, {'quantity': 7, 'user': 1}]):
+  ...     print sorted(values.items()), errors
+  [('quantity', 10), ('user', 2)] {}
+  [('user', 1)] {'quantity': ['Value already exists']}
+  [('user', 1)] {'quantity': ['Value already exists']}
+  [('user', 1)] {'quantity': ['Value already exists']}
+
+
+pure validators run once per value, and the rows of a Grid submitting a value
+again use the outcome of the first one:
+
+  >>> calls = []
+  >>> @pure
+  ... def even(value, field=None):
+  ...     calls.append(value)
+  ...     if value % 2:
+  ...         raise ValidationError('Value must be even')
+  >>> orders = session.query(Order).order_by(Order.id).all()
+  >>> g = Grid(Order, orders, data={'Order-1-quantity': '3', 'Order-2-quantity': '4', 'Order-3-quantity': '3'})
+  >>> g.configure(include=[g.quantity.validate(even)])
+  >>> g.validate(), [g.errors[order] for order in orders]
+  (False, [{AttributeField(quantity): ['Value must be even']}, {}, {AttributeField(quantity): ['Value must be even']}])
+  >>> calls
+  [3, 4]
+  >>> sorted(even.cache_info().items())
+  [('hits', 1), ('maxsize', 1024), ('misses', 2), ('size', 2)]
+  >>> even.cache_clear()
+  >>> g.validate()
+  False
+  >>> calls
+  [3, 4, 3, 4]
+
+Validators without the `field` argument are called with the value only, as
+usual:
+
+  >>> @pure
+  ... def positive(value):
+  ...     if value <= 0:
+  ...         raise ValidationError('Value must be positive')
+  >>> fs = FieldSet(Order)
+  >>> fs.configure(include=[fs.quantity.validate(positive)])
+  >>> fs.rebind(Order, data={'Order--quantity': '-1'})
+  >>> fs.validate(), fs.errors
+  (False, {AttributeField(quantity): ['Value must be positive']})
+  >>> fs.rebind(Order, data={'Order--quantity': '2'})
+  >>> fs.validate()
+  True
+
+
+io_bound validators run concurrently, after the others; their errors are
+reported in the order of the validators, fields and rows:
+
+  >>> import threading
+  >>> started = []
+  >>> both = threading.Event()
+  >>> @io_bound
+  ... def remote(value, field=None):
+  ...     started.append(value)
+  ...     if len(started) == 2:
+  ...         both.set()
+  ...     both.wait(5)
+  ...     if not both.isSet():
+  ...         raise ValidationError('Not run concurrently')
+  ...     if value == 3:
+  ...         raise ValidationError('Rejected by the service')
+  >>> def small(value, field=None):
+  ...     if value < 5:
+  ...         raise ValidationError('Value is too small')
+  >>> g = Grid(Order, orders, data={'Order-1-quantity': '3', 'Order-2-quantity': '4', 'Order-3-quantity': '6'})
+  >>> g.configure(include=[g.quantity.validate(remote).validate(small)])
+  >>> g.validate(), [g.errors[order] for order in orders]
+  (False, [{AttributeField(quantity): ['Rejected by the service', 'Value is too small']}, {AttributeField(quantity): ['Value is too small']}, {}])
+  >>> sorted(started)
+  [3, 4, 6]
+
+  >>> fs = FieldSet(Order)
+  >>> fs.configure(include=[fs.quantity.validate(io_bound(small)), fs.user])
+  >>> fs.rebind(Order, data={'Order--quantity': '3', 'Order--user_id': ''})
+  >>> fs.validate(), fs.quantity.errors, fs.user.errors
+  (False, ['Value is too small'], ['Please enter a value'])
+  >>> fs.rebind(Order, data={'Order--quantity': '6', 'Order--user_id': '1'})
+  >>> fs.validate(), fs.errors
+  (True, {})
+
 """
 
+from formalchemy.validators import ValidationError
+
+def _email_verbose_reference(value, field=None):
+    # email_verbose as it was before it used regular expressions
+    if not value.strip():
+        return None
+    reserved = r'()<>@,;:\"[]'
+    try:
+        recipient, domain = value.split('@', 1)
+    except ValueError:
+        raise ValidationError('Missing @ sign')
+    if [ch for ch in value if ord(ch) < 32]:
+        raise ValidationError('Control characters present')
+    if [ch for ch in value if ord(ch) > 127]:
+        raise ValidationError('Non-ASCII characters present')
+    if not recipient:
+        raise ValidationError('Recipient must be non-empty')
+    if recipient.endswith('.'):
+        raise ValidationError("Recipient must not end with '.'")
+    i = 0
+    while i < len(recipient):
+        if recipient[i] == '"' and (i == 0 or recipient[i - 1] == '.' or recipient[i - 1] == '"'):
+            i += 1
+            while i < len(recipient):
+                if recipient[i] == '"':
+                    break
+                i += 1
+            else:
+                raise ValidationError("Unterminated quoted section in recipient")
+            i += 1
+            if i < len(recipient) and recipient[i] != '.':
+                raise ValidationError("Quoted section must be followed by '@' or '.'")
+            continue
+        if recipient[i] in reserved:
+            raise ValidationError("Reserved character present in recipient")
+        i += 1
+    if not domain:
+        raise ValidationError('Domain must be non-empty')
+    if domain.endswith('.'):
+        raise ValidationError("Domain must not end with '.'")
+    if '..' in domain:
+        raise ValidationError("Domain must not contain '..'")
+    if [ch for ch in domain if ch in reserved]:
+        raise ValidationError("Reserved character present in domain")
+
+def _outcome(validator, value):
+    try:
+        return validator(value)
+    except ValidationError, e:
+        return e.message
+
+def email_verbose_equivalence():
+    r"""
+    email_verbose accepts and rejects the same addresses as the
+    implementation it replaced, with the same messages, for generated
+    addresses made of the characters which matter to it:
+
+    >>> import random
+    >>> from formalchemy.validators import email_verbose
+    >>> rnd = random.Random(822)
+    >>> tokens = list('ab..\\()<>[],;: ') + ['"', '"', 'a.', '"a"', '""', '"@"', u'\x00', u'\x1f', u'\x7f', u'\x80', u'\xe9']
+    >>> def generate():
+    ...     return u''.join([rnd.choice(tokens) for j in xrange(rnd.randint(0, 6))])
+    >>> outcomes = {}
+    >>> differences = []
+    >>> for i in xrange(20000):
+    ...     value = generate() + rnd.choice([u'@', u'@', u'@', u'']) + generate()
+    ...     for v in value, value.encode('latin-1'):
+    ...         outcome = _outcome(email_verbose, v)
+    ...         outcomes[outcome] = True
+    ...         if outcome != _outcome(_email_verbose_reference, v):
+    ...             differences.append(v)
+    >>> differences
+    []
+
+    Every outcome was covered, acceptance and the 12 error messages:
+
+    >>> len(outcomes)
+    13
+    """
+
 
 if __name__ == '__main__':
     import doctest
@@ -4,13 +4,27 @@
 # This module is part of FormAlchemy and is released under
 # the MIT License: http://www.opensource.org/licenses/mit-license.php
 
+import re
+import datetime
+from decimal import Decimal
+from operator import attrgetter
+from weakref import WeakKeyDictionary
+
 from formalchemy import config
 from sqlalchemy.orm import Query, class_mapper
 from sqlalchemy.exceptions import InvalidRequestError # 0.4 support
 import compiler
+try:
+    import json
+except ImportError:
+    try:
+        import simplejson as json
+    except ImportError:
+        # to_json needs Python 2.6 or simplejson
+        json = None
 
 __all__ = ['stringify', 'normalized_options', '_pk', '_pk_one_column',
-           'simple_eval']
+           'simple_eval', 'encode_pk', 'decode_pk']
 
 # see http://code.activestate.com/recipes/364469/ for explanation.
 # 2.6 provides ast.literal_eval, but requiring 2.6 is a bit of a stretch for now
@@ -48,17 +62,190 @@ def simple_eval(source):
     return walker.visit(ast)
 
 
+_absent = object()
+
+class _LRUCache(object):
+    """
+    A mapping keeping about the `capacity` most recently used items: items
+    are kept in two generations of at most `capacity / 2` items, the older
+    one being dropped when the recent one is full. Items read from the old
+    generation move to the recent one.
+    """
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._recent = {}
+        self._old = {}
+
+    def get(self, key, default=None):
+        value = self._recent.get(key, _absent)
+        if value is not _absent:
+            return value
+        value = self._old.pop(key, _absent)
+        if value is _absent:
+            return default
+        self[key] = value
+        return value
+
+    def __setitem__(self, key, value):
+        recent = self._recent
+        if len(recent) >= max(1, self.capacity // 2) and key not in recent:
+            self._old = recent
+            self._recent = recent = {}
+        recent[key] = value
+
+    def __len__(self):
+        return len(self._recent) + len(self._old)
+
+    def clear(self):
+        self._recent.clear()
+        self._old.clear()
+
+
+# Composite primary keys are posted as their items joined with `|`. Each
+# item is a type tag followed by its value: `i` int, `f` float, `b` bool,
+# `n` None, `s` string (with `\` and `|` escaped by a `\`). Keys with items
+# of other types keep the legacy repr form, e.g. `(1, datetime.date(...))`.
+_pk_tags = [(bool, 'b'), (int, 'i'), (long, 'i'), (float, 'f'),
+            (basestring, 's')]
+_pk_cache = _LRUCache(1024)
+
+def _encode_pk_item(v):
+    if v is None:
+        return u'n'
+    for t, tag in _pk_tags:
+        if isinstance(v, t):
+            break
+    else:
+        raise TypeError(v)
+    if tag == 'b':
+        return v and u'b1' or u'b0'
+    if tag == 's':
+        return u's' + stringify(v).replace(u'\\', u'\\\\').replace(u'|', u'\\|')
+    return tag + unicode(repr(v)).rstrip(u'L')
+
+def encode_pk(value):
+    """
+    Return the string form of the primary key `value`, as used for option
+    values. Composite keys are encoded as described above, so that
+    `decode_pk` can turn them back into tuples without evaluating anything::
+
+        >>> encode_pk((1, u'a|b', None))
+        u'i1|sa\\\\|b|n'
+        >>> encode_pk(1)
+        u'1'
+    """
+    if not isinstance(value, tuple):
+        return stringify(value)
+    try:
+        return u'|'.join([_encode_pk_item(v) for v in value])
+    except TypeError:
+        return stringify(value)
+
+def _split_pk(source):
+    if '\\' not in source:
+        return source.split('|')
+    items, current, chars = [], [], iter(source)
+    for c in chars:
+        if c == '\\':
+            current.append(chars.next())
+        elif c == '|':
+            items.append(''.join(current))
+            current = []
+        else:
+            current.append(c)
+    items.append(''.join(current))
+    return items
+
+def _decode_pk_item(item):
+    tag, v = item[:1], item[1:]
+    if tag == 's':
+        return v
+    if tag == 'i':
+        return int(v)
+    if tag == 'n' and not v:
+        return None
+    if tag == 'b' and v in ('0', '1'):
+        return v == '1'
+    if tag == 'f':
+        return float(v)
+    raise ValueError('invalid primary key item %r' % item)
+
+_legacy_pk_item = re.compile(r"""\s*(?:(-?\d+)L?|(u?)'([^'\\]*)'|(u?)"([^"\\]*)"|(None|True|False))\s*(?:,|$)""")
+_legacy_pk_constants = {'None': None, 'True': True, 'False': False}
+
+def _decode_legacy_pk(source):
+    """parse the repr of a flat tuple of ints, strings and constants, and
+    leave anything else to `simple_eval`"""
+    inner = source.strip()
+    if not (inner.startswith('(') and inner.endswith(')')):
+        return simple_eval(source)
+    inner = inner[1:-1]
+    items, pos = [], 0
+    while pos < len(inner):
+        match = _legacy_pk_item.match(inner, pos)
+        if match is None or match.end() == pos:
+            return simple_eval(source)
+        number, u1, s1, u2, s2, constant = match.groups()
+        if number is not None:
+            items.append(int(number))
+        elif s1 is not None or s2 is not None:
+            text = s1 is not None and s1 or s2
+            if u1 or u2:
+                items.append(unicode(text))
+            else:
+                try:
+                    items.append(str(text))
+                except UnicodeError:
+                    return simple_eval(source)
+        else:
+            items.append(_legacy_pk_constants[constant])
+        pos = match.end()
+    return tuple(items)
+
+def decode_pk(source):
+    """
+    Return the composite primary key encoded in `source` by `encode_pk`, or
+    in the legacy repr form::
+
+        >>> decode_pk(u'i1|sa\\|b|n')
+        (1, u'a|b', None)
+        >>> decode_pk("(1, '22')")
+        (1, '22')
+    """
+    if not source:
+        return None
+    value = _pk_cache.get(source)
+    if value is not None:
+        return value
+    if source[:1] in '([':
+        value = _decode_legacy_pk(source)
+    else:
+        value = tuple([_decode_pk_item(item) for item in _split_pk(source)])
+    if isinstance(value, tuple):
+        _pk_cache[source] = value
+    return value
+
+
+# copy of config.encoding, kept up to date by _config_changed
+_encoding = config.encoding
+
+def _config_changed(attr, value):
+    global _encoding
+    if attr == 'encoding':
+        _encoding = value
+config.add_listener(_config_changed)
+
 def stringify(k, null_value=u''):
     if k is None:
         return null_value
     if isinstance(k, str):
-        return unicode(k, config.encoding)
+        return unicode(k, _encoding)
     elif isinstance(k, unicode):
         return k
     elif hasattr(k, '__unicode__'):
         return unicode(k)
     else:
-        return unicode(str(k), config.encoding)
+        return unicode(str(k), _encoding)
 
 def _pk_one_column(instance, column):
     try:
@@ -78,16 +265,49 @@ def _pk_one_column(instance, column):
                     break
     return attr
 
+def _pk_attribute_name(cls, column):
+    """return the name of the attribute of mapped class `cls` holding `column`"""
+    # see _pk_one_column
+    for k in cls._sa_class_manager.keys():
+        props = getattr(cls, k).property
+        if hasattr(props, 'columns'):
+            if props.columns[0] is column:
+                return k
+    return column.key
+
+def _pk_getter(cls):
+    """return a function returning the primary key of instances of the
+    mapped class `cls`"""
+    columns = class_mapper(cls).primary_key
+    getters = [attrgetter(_pk_attribute_name(cls, column)) for column in columns]
+    if len(getters) == 1:
+        return getters[0]
+    def getter(instance):
+        return tuple([get(instance) for get in getters])
+    return getter
+
+# mapped class -> primary key getter. Unmapped classes are not cached, since
+# they may be mapped later
+_pk_getters = WeakKeyDictionary()
+
 def _pk(instance):
     # Return the value of this instance's primary key, suitable for passing to Query.get().  
     # Will be a tuple if PK is multicolumn.
+    cls = type(instance)
     try:
-        columns = class_mapper(type(instance)).primary_key
-    except InvalidRequestError:
-        return None
-    if len(columns) == 1:
-        return _pk_one_column(instance, columns[0])
-    return tuple([_pk_one_column(instance, column) for column in columns])
+        getter = _pk_getters[cls]
+    except KeyError:
+        try:
+            getter = _pk_getters[cls] = _pk_getter(cls)
+        except InvalidRequestError:
+            return None
+        except TypeError:
+            # not weakly referenceable
+            try:
+                return _pk_getter(cls)(instance)
+            except InvalidRequestError:
+                return None
+    return getter(instance)
 
 
 
@@ -121,3 +341,28 @@ def normalized_options(options):
         return list(options)
     return query_options(options)
 
+
+
+def _json_value(v):
+    """
+    Return `v` as a value `json` can encode: dates and times as ISO 8601
+    strings, decimals as strings (they would lose precision as floats),
+    sequences as lists and other objects as unicode.
+    """
+    if v is None or isinstance(v, (bool, int, long, float, unicode)):
+        return v
+    if isinstance(v, str):
+        return stringify(v)
+    if isinstance(v, (datetime.date, datetime.time)):
+        # datetime is a subclass of date
+        return v.isoformat()
+    if isinstance(v, Decimal):
+        return str(v)
+    if isinstance(v, (list, tuple)):
+        return [_json_value(item) for item in v]
+    return stringify(v)
+
+def _json_module():
+    if json is None:
+        raise ImportError('to_json needs the json module (Python 2.6+) or simplejson')
+    return json
@@ -3,11 +3,18 @@
 # This module is part of FormAlchemy and is released under
 # the MIT License: http://www.opensource.org/licenses/mit-license.php
 
+import re
+import sys
+import threading
+import warnings
+import Queue
+
 from formalchemy.i18n import _
+from formalchemy.utils import _LRUCache, _pk
 
 __all__ = ['ValidationError', 'required', 'integer', 'float_', 'decimal_',
            'currency', 'email', 'email_verbose', 'maxlength', 'minlength',
-           'regex', 'passwords_match']
+           'regex', 'passwords_match', 'unique', 'pure', 'io_bound']
 
 if 'any' not in locals():
     # pre-2.5 support
@@ -38,6 +45,205 @@ def required(value, field=None):
         msg = isinstance(value, list) and _('Please select a value') or _('Please enter a value')
         raise ValidationError(msg)
 
+# Validators may have a `batch` attribute: a function validating a list of
+# values at once (a Grid column, see `Grid.columnar_validation`), returning
+# for each value what the validator returns, or the ValidationError it raises.
+
+def _batch(validator):
+    """return a `batch` function calling `validator` for each value"""
+    def batch(values, field=None):
+        results = []
+        append = results.append
+        for value in values:
+            try:
+                append(validator(value, field))
+            except ValidationError, e:
+                append(e)
+        return results
+    return batch
+
+def _required_batch(values, field=None):
+    results = []
+    append = results.append
+    for value in values:
+        if value is None or value == '':
+            msg = isinstance(value, list) and _('Please select a value') or _('Please enter a value')
+            append(ValidationError(msg))
+        else:
+            append(None)
+    return results
+required.batch = _required_batch
+
+def _conversion_batch(convert, msg):
+    """return a `batch` function for a validator converting values with
+    `convert`, and failing with `msg`"""
+    def batch(values, field=None):
+        results = []
+        append = results.append
+        for value in values:
+            if value is None or not value.strip():
+                append(None)
+                continue
+            try:
+                append(convert(value))
+            except:
+                append(ValidationError(_(msg)))
+        return results
+    return batch
+
+_missing = object()
+_unhashable = object()
+
+def pure(validator=None, maxsize=1024):
+    """
+    Declare `validator` pure: its outcome only depends on the value, not on
+    the field or on anything else, so outcomes (the returned value, or the
+    `ValidationError` raised) are kept in a cache of the `maxsize` most
+    recently validated values. Use as a decorator, with or without
+    arguments, or call it on a validator::
+
+        >>> @pure
+        ... def postcode(value, field=None):
+        ...     if not value.isdigit():
+        ...         raise ValidationError('Invalid postcode')
+        >>> name_validator = pure(maxlength(30), maxsize=100)
+
+    The returned validator has a `cache_info()` method, returning the number
+    of `hits` and `misses` of the cache, its `size` and its `maxsize`, and a
+    `cache_clear()` method. Values which cannot be hashed are not cached.
+    The cache is shared by the threads running the validator, e.g. when it
+    is also `io_bound`.
+    """
+    if validator is None:
+        return lambda validator: pure(validator, maxsize)
+    cache = _LRUCache(maxsize)
+    # hits, misses
+    stats = [0, 0]
+    # the validator may run in several threads, see `io_bound`
+    lock = threading.Lock()
+    def call(value, field):
+        # as AbstractField._validate calls validators
+        try:
+            return validator(value, field)
+        except TypeError:
+            warnings.warn(DeprecationWarning('Please provide a field argument to your %r validator. Your validator will break in FA 1.5' % validator))
+            return validator(value)
+    def store(key, outcome):
+        lock.acquire()
+        try:
+            cache[key] = outcome
+        finally:
+            lock.release()
+    def f(value, field=None):
+        # 1, 1.0 and True are equal, but the validators may tell them apart
+        key = (value.__class__, value)
+        lock.acquire()
+        try:
+            try:
+                outcome = cache.get(key, _missing)
+            except TypeError:
+                outcome = _unhashable
+            else:
+                if outcome is _missing:
+                    stats[1] += 1
+                else:
+                    stats[0] += 1
+        finally:
+            lock.release()
+        if outcome is _unhashable:
+            return call(value, field)
+        if outcome is not _missing:
+            if isinstance(outcome, ValidationError):
+                raise outcome
+            return outcome[0]
+        try:
+            result = call(value, field)
+        except ValidationError, e:
+            store(key, e)
+            raise
+        store(key, (result,))
+        return result
+    def cache_info():
+        lock.acquire()
+        try:
+            return {'hits': stats[0], 'misses': stats[1],
+                    'size': len(cache), 'maxsize': maxsize}
+        finally:
+            lock.release()
+    def cache_clear():
+        lock.acquire()
+        try:
+            cache.clear()
+            stats[0] = stats[1] = 0
+        finally:
+            lock.release()
+    f.cache_info = cache_info
+    f.cache_clear = cache_clear
+    f.batch = _batch(f)
+    f.pure = True
+    f.__name__ = validator.__name__
+    f.__doc__ = validator.__doc__
+    return f
+
+def io_bound(validator):
+    """
+    Declare `validator` I/O-bound, e.g. because it calls a remote service:
+    `FieldSet.validate()` and `Grid.validate()` then run it for all the
+    fields and rows concurrently, in at most `io_workers` threads (an
+    attribute of the FieldSet or Grid class, 8 by default; 0 or 1 runs them
+    one after the other), after the other validators. Errors are reported
+    as if the validators had run in order.
+
+    The validator is called in another thread: it must not use the session
+    of the form. In a `Grid`, `field` is bound to the last row by then, so
+    the validator should only depend on the value.
+    """
+    def f(value, field=None):
+        return validator(value, field)
+    f.io_bound = True
+    f.__name__ = validator.__name__
+    f.__doc__ = validator.__doc__
+    return f
+
+def _run_concurrently(calls, workers):
+    """
+    Run the `(function, args)` pairs of `calls` in at most `workers`
+    threads, and return the list of their results, in order, with the
+    ValidationError raised for those which raised one. Other exceptions are
+    raised again (the first one in the order of `calls`).
+    """
+    outcomes = [None] * len(calls)
+    queue = Queue.Queue()
+    for i in xrange(len(calls)):
+        queue.put(i)
+    def work():
+        while True:
+            try:
+                i = queue.get_nowait()
+            except Queue.Empty:
+                return
+            func, args = calls[i]
+            try:
+                outcomes[i] = (True, func(*args))
+            except ValidationError, e:
+                outcomes[i] = (True, e)
+            except:
+                outcomes[i] = (False, sys.exc_info())
+    if workers <= 1 or len(calls) <= 1:
+        work()
+    else:
+        threads = [threading.Thread(target=work) for i in xrange(min(workers, len(calls)))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    results = []
+    for ok, outcome in outcomes:
+        if not ok:
+            raise outcome[0], outcome[1], outcome[2]
+        results.append(outcome)
+    return results
+
 # other validators will not be called for empty values
 
 def integer(value, field=None):
@@ -50,6 +256,7 @@ def integer(value, field=None):
         return int(value)
     except:
         raise ValidationError(_('Value is not an integer'))
+integer.batch = _conversion_batch(int, 'Value is not an integer')
 
 def float_(value, field=None):
     """Successful if value is a float"""
@@ -61,6 +268,7 @@ def float_(value, field=None):
         return float(value)
     except:
         raise ValidationError(_('Value is not a number'))
+float_.batch = _conversion_batch(float, 'Value is not a number')
 
 from decimal import Decimal
 def decimal_(value, field=None):
@@ -73,11 +281,18 @@ def decimal_(value, field=None):
         return Decimal(value)
     except:
         raise ValidationError(_('Value is not a number'))
+decimal_.batch = _conversion_batch(Decimal, 'Value is not a number')
 
 def currency(value, field=None):
     """Successful if value looks like a currency amount (has exactly two digits after a decimal point)"""
     if '%.2f' % float_(value) != value:
         raise ValidationError('Please specify full currency value, including cents (e.g., 12.34)')
+currency.batch = _batch(currency)
+
+# characters reserved by RFC 822 outside of quoted regions
+_email_reserved = re.compile(r'[()<>@,;:\\"\[\]]')
+_email_special = re.compile(r'[^\x20-\x7f]')
+_email_control = re.compile(r'[\x00-\x1f]')
 
 def email_verbose(value, field=None):
     """
@@ -90,16 +305,14 @@ def email_verbose(value, field=None):
     if not value.strip():
         return None
 
-    reserved = r'()<>@,;:\"[]'
-
     try:
         recipient, domain = value.split('@', 1)
     except ValueError:
         raise ValidationError(_('Missing @ sign'))
 
-    if any([ord(ch) < 32 for ch in value]):
-        raise ValidationError(_('Control characters present'))
-    if any([ord(ch) > 127 for ch in value]):
+    if _email_special.search(value) is not None:
+        if _email_control.search(value) is not None:
+            raise ValidationError(_('Control characters present'))
         raise ValidationError(_('Non-ASCII characters present'))
 
     # validate recipient
@@ -108,27 +321,25 @@ def email_verbose(value, field=None):
     if recipient.endswith('.'):
         raise ValidationError(_("Recipient must not end with '.'"))
 
-    # quoted regions, aka the reason any regexp-based validator is wrong
-    i = 0
-    while i < len(recipient):
+    # quoted regions, aka the reason any regexp-based validator is wrong:
+    # the regexp only skips to the next reserved character
+    search = _email_reserved.search
+    match = search(recipient)
+    while match is not None:
+        i = match.start()
         if recipient[i] == '"' and (i == 0 or recipient[i - 1] == '.' or recipient[i - 1] == '"'):
             # begin quoted region -- reserved characters are allowed here.
             # (this implementation allows a few addresses not strictly allowed by rfc 822 --
             # for instance, a quoted region that ends with '\' appears to be illegal.)
-            i += 1
-            while i < len(recipient):
-                if recipient[i] == '"':
-                    break # end of quoted region
-                i += 1
-            else:
+            i = recipient.find('"', i + 1)
+            if i < 0:
                 raise ValidationError(_("Unterminated quoted section in recipient"))
             i += 1
             if i < len(recipient) and recipient[i] != '.':
                 raise ValidationError(_("Quoted section must be followed by '@' or '.'"))
+            match = search(recipient, i)
             continue
-        if recipient[i] in reserved:
-            raise ValidationError(_("Reserved character present in recipient"))
-        i += 1
+        raise ValidationError(_("Reserved character present in recipient"))
 
     # validate domain
     if not domain:
@@ -137,8 +348,9 @@ def email_verbose(value, field=None):
         raise ValidationError(_("Domain must not end with '.'"))
     if '..' in domain:
         raise ValidationError(_("Domain must not contain '..'"))
-    if any([ch in reserved for ch in domain]):
+    if _email_reserved.search(domain) is not None:
         raise ValidationError(_("Reserved character present in domain"))
+email_verbose.batch = _batch(email_verbose)
 
 
 def email(value, field=None):
@@ -148,6 +360,7 @@ def email(value, field=None):
         email_verbose(value, field)
     except ValidationError:
         raise ValidationError(_("Invalid e-mail address"))
+email.batch = _batch(email)
 
 
 # parameterized validators return the validation function
@@ -158,6 +371,15 @@ def maxlength(length):
     def f(value, field=None):
         if len(value) > length:
             raise ValidationError(_('Value must be no more than %d characters long') % length)
+    def batch(values, field=None):
+        results = []
+        for value in values:
+            if len(value) > length:
+                results.append(ValidationError(_('Value must be no more than %d characters long') % length))
+            else:
+                results.append(None)
+        return results
+    f.batch = batch
     return f
 
 def minlength(length):
@@ -167,6 +389,15 @@ def minlength(length):
     def f(value, field=None):
         if len(value) < length:
             raise ValidationError(_('Value must be at least %d characters long') % length)
+    def batch(values, field=None):
+        results = []
+        for value in values:
+            if len(value) < length:
+                results.append(ValidationError(_('Value must be at least %d characters long') % length))
+            else:
+                results.append(None)
+        return results
+    f.batch = batch
     return f
 
 def regex(exp, errormsg=_('Invalid input')):
@@ -176,12 +407,21 @@ def regex(exp, errormsg=_('Invalid input')):
     Expressions may be either a string or a Pattern object of the sort returned by
     re.compile.
     """
-    import re
     if type(exp) != type(re.compile('')):
         exp = re.compile(exp)
     def f(value, field=None):
         if not exp.match(value):
             raise ValidationError(errormsg)
+    def batch(values, field=None):
+        match = exp.match
+        results = []
+        for value in values:
+            if not match(value):
+                results.append(ValidationError(errormsg))
+            else:
+                results.append(None)
+        return results
+    f.batch = batch
     return f
 
 def passwords_match(first_password_field):
@@ -205,6 +445,160 @@ def passwords_match(first_password_field):
             raise ValidationError(_('Passwords must match'))
     return f
 
+def unique(column=None, scope=[], errormsg=_('Value already exists')):
+    """
+    Returns a validator that is successful if no other object of the class of
+    the bound model has the same value, which is checked with a query.
+
+    - `column`: the attribute (or its name) to look the value up in, by
+      default the attribute of the field.
+
+    - `scope`: names of attributes whose values must be the same for two
+      objects to conflict, e.g. `scope=['user_id']` for a value which is
+      unique per user. The values submitted for the fields of these
+      attributes (`user` for `user_id`) are used, or the values of the bound
+      model for attributes which are not fields of the form.
+
+    The bound model itself is not a conflict. When a `Grid` is validated,
+    the submitted values of all its rows are looked up with a single `IN`
+    query when the first row is, and rows which were submitted the same
+    value conflict with each other (a row whose value is submitted to
+    another row does not conflict with it: its own value is replaced).
+    """
+    def check(values, field, models=None, records=None):
+        if not values:
+            return []
+        from sqlalchemy.orm import class_mapper
+        cls = field.model.__class__
+        attribute = column
+        if attribute is None:
+            attribute = field.key
+        if isinstance(attribute, basestring):
+            attribute = getattr(cls, attribute)
+        scoped = [getattr(cls, name) for name in scope]
+        pk_columns = list(class_mapper(cls).primary_key)
+        keys = []
+        replaced = {}
+        for value, scope_values in zip(values, _scope_values(scope, field, len(values), models, records)):
+            if scope_values is None:
+                # invalid scope: the error is that of the scope field
+                keys.append(None)
+            else:
+                keys.append((value,) + scope_values)
+        for model in models or []:
+            pk = _pk(model)
+            if pk is not None:
+                if not isinstance(pk, tuple):
+                    pk = (pk,)
+                replaced[pk] = True
+        existing = {}
+        distinct = dict([(key[0], True) for key in keys if key is not None]).keys()
+        q = field.query(*([attribute] + scoped + pk_columns))
+        # stay below the bound parameters limit of some databases
+        for i in xrange(0, len(distinct), 500):
+            for row in q.filter(attribute.in_(distinct[i:i + 500])):
+                row = tuple(row)
+                key, pk = row[:len(scoped) + 1], row[len(scoped) + 1:]
+                if pk not in replaced:
+                    existing[key] = True
+        counts = {}
+        for key in keys:
+            counts[key] = counts.get(key, 0) + 1
+        results = []
+        for key in keys:
+            if key is not None and (key in existing or counts[key] > 1):
+                results.append(ValidationError(errormsg))
+            else:
+                results.append(None)
+        return results
+
+    def check_grid(field):
+        """return the result for the active row of the Grid of `field`, the
+        rows of which are all checked at once during `Grid.validate`"""
+        from formalchemy import renderers
+        grid = field.parent
+        model = field.model
+        cache = grid._validation_cache
+        read = renderers._column_reader(field.renderer)
+        if read is None:
+            return check([field._deserialize()], field, [model])[0]
+        if (check, field.name) not in cache:
+            rows = list(grid.rows)
+            name_for = field.renderer._name_for
+            values = field._deserialize_values(read(grid.data, [name_for(row, _pk(row)) for row in rows]))
+            indexes = [i for i, value in enumerate(values)
+                       if value is not None and not isinstance(value, ValidationError)]
+            results = {}
+            checked = check([values[i] for i in indexes], field, [rows[i] for i in indexes])
+            for i, result in zip(indexes, checked):
+                results[id(rows[i])] = result
+            # the rows are kept to keep their ids valid
+            cache[(check, field.name)] = results, rows
+        results, rows = cache[(check, field.name)]
+        return results.get(id(model))
+
+    def f(value, field):
+        if getattr(field.parent, '_validation_cache', None) is not None:
+            result = check_grid(field)
+        else:
+            result = check([value], field, [field.model])[0]
+        if result is not None:
+            raise result
+    # see AbstractField._validate_values
+    check.uses_models = True
+    f.batch = check
+    return f
+
+def _scope_values(scope, field, count, models, records):
+    """
+    Return the tuple of the values of the `scope` attributes for each of
+    the `count` values validated by `unique`: the values submitted for
+    the fields of these attributes in `records` (see
+    `FieldSet.validate_records`) or for `models` in the data of the parent
+    of `field`, or else the values of `models`. The tuple is None if a
+    value could not be deserialized.
+    """
+    from formalchemy import renderers
+    parent = field.parent
+    columns = []
+    for name in scope:
+        other = None
+        for f in parent.render_fields.itervalues():
+            if name in (f.key, f.name) and not f.is_collection:
+                other = f
+                break
+        if records is not None:
+            if other is None:
+                column = [None] * count
+            else:
+                column = other._deserialize_values([record.get(other.key) for record in records])
+        elif models is None:
+            column = [None] * count
+        elif other is None or other.is_readonly() or parent.data is None:
+            column = [getattr(model, name) for model in models]
+        else:
+            read = renderers._column_reader(other.renderer)
+            if read is not None:
+                name_for = other.renderer._name_for
+                column = other._deserialize_values(read(parent.data, [name_for(model, _pk(model)) for model in models]))
+            elif count == 1 and models[0] is other.model:
+                try:
+                    column = [other._deserialize()]
+                except ValidationError, e:
+                    column = [e]
+            else:
+                column = [getattr(model, name) for model in models]
+        columns.append(column)
+    results = []
+    for i in xrange(count):
+        values = tuple([column[i] for column in columns])
+        for value in values:
+            if isinstance(value, ValidationError):
+                values = None
+                break
+        results.append(values)
+    return results
+
 # possible others:
 # oneof raises if input is not one of [or a subset of for multivalues] the given list of possibilities
 # url(check_exists=False)
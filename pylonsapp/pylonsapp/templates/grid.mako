@@ -22,3 +22,4 @@
   </tr>
 %endfor
 </tbody>
+${collection.render_shared_options()|n}